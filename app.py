@@ -1,9 +1,13 @@
 # imports
 import os
 import re
+import sqlite3
+import threading
+import time
 from collections import defaultdict
 from flask import (
     Flask,
+    g,
     render_template,
     abort,
     jsonify,
@@ -12,11 +16,12 @@ from flask import (
 from werkzeug.exceptions import HTTPException
 from flask_caching import Cache
 from datetime import datetime, timezone
-import mysql.connector
 from mysql.connector import Error
-from sshtunnel import SSHTunnelForwarder
 
-from utils.specs import build_specs
+from utils import caching, db_pool, facets, replica
+from utils.assets import init_assets
+from utils.page_cache import PageCache
+from utils.specs import get_specs
 from utils.airtable import (
     init_cache,
     get_vehicles,
@@ -28,6 +33,9 @@ from utils.airtable import (
     get_vehicle_by_slug,
     get_head_by_slug,
     get_configs_for_vehicle,
+    get_catalog_context,
+    invalidate_records,
+    ALL_KEYS,
 )
 
 # -------------------------------------------------
@@ -39,26 +47,91 @@ app = Flask(
     static_folder=os.getenv("STATIC_FOLDER"),
     static_url_path=os.getenv("STATIC_URL_PATH"),
 )
+
+# Les champs absents d'un record valent None : les afficher comme vides
+app.jinja_env.finalize = lambda value: "" if value is None else value
+
+# 🏷️ Assets fingerprintés (python build_assets.py au déploiement)
+init_assets(app)
 # -------------------------------------------------
 # Cache config
 # -------------------------------------------------
 
 
-def warm_cache():
+def warm_cache(render_pages=False):
+    """
+    Charge toutes les listes puis chaque fiche (slug, configs, produits de grips),
+    et pré-rend les pages si render_pages est vrai.
+    """
+    # Un seul worker par machine fait le warm : le cache est partagé
+    if not cache.add("warm_cache_lock", os.getpid(), timeout=600):
+        app.logger.info("🔥 Cache déjà warmé par un autre worker")
+        return
+
+    started = time.monotonic()
     try:
-        get_vehicles()
-        get_heads()
-        get_grips_categories()
+        vehicles = get_vehicles()
+        heads = get_heads()
+        grips_categories = get_grips_categories()
         get_static_by_lang("en")
-        app.logger.info("🔥 Cache warmé avec succès")
+
+        tasks = []
+        for vehicle in vehicles:
+            slug = vehicle["fields"].get("slug")
+            tasks.append((f"/vehicles/{slug}", lambda v=vehicle, s=slug: (
+                get_vehicle_by_slug(s), get_configs_for_vehicle(v["id"]))))
+        for head in heads:
+            slug = head["fields"].get("slug")
+            tasks.append((f"/heads/{slug}", lambda s=slug: get_head_by_slug(s)))
+        for category in grips_categories:
+            slug = category["fields"].get("slug")
+            tasks.append((f"/grips/{slug}", lambda c=category, s=slug: (
+                get_grips_categories_by_slug(s), get_grips_products_for_category(c["id"]))))
+
+        for done, (path, warm) in enumerate(tasks, 1):
+            try:
+                warm()
+            except Exception as e:
+                app.logger.error(f"❌ Erreur warm {path} : {e}")
+            if done % 20 == 0 or done == len(tasks):
+                app.logger.info(f"🔥 Warm {done}/{len(tasks)} fiches")
+
+        if render_pages:
+            paths = ["/", "/vehicles", "/heads", "/grips", "/about-us", "/contact",
+                     "/terms-and-conditions"] + [path for path, _ in tasks]
+            with app.test_client() as client:
+                for path in paths:
+                    client.get(path)
+            app.logger.info(f"🔥 {len(paths)} pages pré-rendues")
+
+        app.logger.info(f"🔥 Cache warmé avec succès en {time.monotonic() - started:.1f}s")
     except Exception as e:
+        cache.delete("warm_cache_lock")
         app.logger.error(f"❌ Erreur warm cache : {e}")
 
 
+def start_warm_cache():
+    """Lance le warm dans un thread : le worker accepte les requêtes tout de suite."""
+    render_pages = os.getenv("WARM_RENDER_PAGES", "false").lower() == "true"
+    threading.Thread(
+        target=warm_cache,
+        kwargs={"render_pages": render_pages},
+        name="cache-warmup",
+        daemon=True,
+    ).start()
+
+
 cache = Cache()
 
-if os.getenv("FLASK_ENV") == "production":
-    app.config["CACHE_TYPE"] = "SimpleCache"
+# Cache partagé entre les workers : Redis si configuré, sinon fichiers
+# sur disque (écritures atomiques), SimpleCache en développement
+if os.getenv("CACHE_REDIS_URL"):
+    app.config["CACHE_TYPE"] = "RedisCache"
+    app.config["CACHE_REDIS_URL"] = os.getenv("CACHE_REDIS_URL")
+elif os.getenv("FLASK_ENV") == "production":
+    app.config["CACHE_TYPE"] = "FileSystemCache"
+    app.config["CACHE_DIR"] = os.getenv("CACHE_DIR", "/tmp/bellevitesse-cache")
+    app.config["CACHE_THRESHOLD"] = int(os.getenv("CACHE_THRESHOLD", "5000"))
 else:
     app.config["CACHE_TYPE"] = "SimpleCache"
 
@@ -67,12 +140,16 @@ app.config["CACHE_KEY_PREFIX"] = "myapp_"
 
 cache.init_app(app)
 
+# 📄 Cache des pages rendues (ETag / 304)
+page_cache = PageCache(
+    cache,
+    timeout=app.config["CACHE_DEFAULT_TIMEOUT"],
+    max_age=int(os.getenv("PAGE_MAX_AGE", "300")),
+)
+
 # 🔌 Brancher le cache au service Airtable
 init_cache(cache)
 
-if os.getenv("FLASK_ENV") == "production":
-    warm_cache()
-
 # -------------------------------------------------
 # Gestion des tokens admin
 # -------------------------------------------------
@@ -84,59 +161,39 @@ def require_admin_token():
         abort(403)
 
 # -------------------------------------------------
-# DB Connection Helper
-# -------------------------------------------------
-
-def get_db_connection():
-    """Create and return a MySQL connection."""
-    mysql_host = os.getenv("MYSQL_HOST")
-    mysql_user = os.getenv("MYSQL_USER")
-    mysql_password = os.getenv("MYSQL_PASSWORD")
-    mysql_database = os.getenv("MYSQL_DATABASE")
-    
-    use_ssh = os.getenv("USE_SSH_TUNNEL", "false").lower() == "true"
-    
-    if use_ssh:
-        ssh_host = os.getenv("SSH_HOST")
-        ssh_user = os.getenv("SSH_USER")
-        ssh_password = os.getenv("SSH_PASSWORD")
-        
-        tunnel = SSHTunnelForwarder(
-            (ssh_host, 22),
-            ssh_username=ssh_user,
-            ssh_password=ssh_password,
-            remote_bind_address=(mysql_host, 3306)
-        )
-        tunnel.start()
-        
-        connection = mysql.connector.connect(
-            host="127.0.0.1",
-            port=tunnel.local_bind_port,
-            user=mysql_user,
-            password=mysql_password,
-            database=mysql_database
-        )
-        return connection, tunnel
-    else:
-        connection = mysql.connector.connect(
-            host=mysql_host,
-            user=mysql_user,
-            password=mysql_password,
-            database=mysql_database
-        )
-        return connection, None
-# -------------------------------------------------
 # Context processor (footer global)
 # -------------------------------------------------
 
 
+# Contexte commun gardé par process : reconstruit à chaque nouvelle
+# version du catalogue, et au plus tard après CATALOG_CONTEXT_TTL secondes
+# (les listes sont rafraîchies en arrière-plan par le cache)
+CATALOG_CONTEXT_TTL = int(os.getenv("CATALOG_CONTEXT_TTL", "60"))
+_catalog_context = None  # (version, expires, context)
+
+
+def current_catalog_context():
+    """Contexte du catalogue, résolu une seule fois par requête."""
+    if "catalog_context" not in g:
+        global _catalog_context
+        version = (caching.get_generation(), page_cache.version())
+        memo = _catalog_context
+        if memo is None or memo[0] != version or memo[1] < time.time():
+            memo = (version, time.time() + CATALOG_CONTEXT_TTL, get_catalog_context("en"))
+            _catalog_context = memo
+        g.catalog_context = memo[2]
+    return g.catalog_context
+
+
 @app.context_processor
 def inject_globals():
+    catalog = current_catalog_context()
     return {
-        "vehicles": get_vehicles(),
-        "heads": get_heads(),
-        "grips_categories": get_grips_categories(),
-        "static": get_static_by_lang("en"),
+        "catalog": catalog,
+        "vehicles": catalog.vehicles,
+        "heads": catalog.heads,
+        "grips_categories": catalog.grips_categories,
+        "static": catalog.static,
         "now": datetime.now(timezone.utc)
     }
 
@@ -167,6 +224,7 @@ app.jinja_env.filters['slugify'] = lambda s: s.lower().replace(" ", "_")
 # -------------------------------------------------
 
 @app.route("/")
+@page_cache.cached
 def home():
     return render_template("home.html", brands=BRANDS)
 
@@ -185,16 +243,58 @@ def handle_exception(e):
 # -----------------------
 
 
+# Sliders de /vehicles : facette -> valeur minimale par défaut
+VEHICLE_SLIDER_DEFAULTS = {"max_speed": 5, "passengers": 0}
+
+
+def vehicle_filters(args):
+    try:
+        return facets.parse_filters(args)
+    except ValueError as e:
+        abort(400, description=str(e))
+
+
+def query_vehicles(filters):
+    """Filtre les véhicules via l'index de facettes (construit au chargement du catalogue)."""
+    index = facets.get_facet_index(current_catalog_context().vehicles)
+    return index.query(filters)
+
+
+def render_vehicles(filters):
+    # Les sliders filtrent dès l'affichage : leurs valeurs par défaut s'appliquent
+    ranges = dict(filters.ranges)
+    for name, default in VEHICLE_SLIDER_DEFAULTS.items():
+        ranges.setdefault(name, (default, None))
+    filters = filters._replace(ranges=ranges)
+
+    return render_template(
+        "vehicles.html",
+        matching=query_vehicles(filters).records,
+        slider_values={name: ranges[name][0] for name in VEHICLE_SLIDER_DEFAULTS},
+    )
+
+
+@page_cache.cached
+def vehicles_default():
+    return render_vehicles(facets.Filters({}, {}))
+
+
 @app.route("/vehicles")
 def vehicles():
-    return render_template("vehicles.html")
+    # Sans filtre dans l'URL : page par défaut, en cache
+    filters = vehicle_filters(request.args)
+    if not filters.ranges and not filters.categories:
+        return vehicles_default()
+    return render_vehicles(filters)
 
 
 @app.route("/heads")
+@page_cache.cached
 def heads():
     return render_template("heads.html")
 
 @app.route("/grips")
+@page_cache.cached
 def grips():
     return render_template("grips.html")
 
@@ -205,6 +305,7 @@ def grips():
 # -----------------------
 
 @app.route("/vehicles/<slug>")
+@page_cache.cached
 def vehicle(slug):
     vehicle = get_vehicle_by_slug(slug)
     if not vehicle:
@@ -217,7 +318,7 @@ def vehicle(slug):
         type_name = config["fields"].get("type", "Sans type")
         grouped[type_name].append(config)
 
-    specs_left, specs_right = build_specs(vehicle["fields"])
+    specs_left, specs_right = get_specs(vehicle)
 
     return render_template(
         "vehicle.html",
@@ -229,12 +330,13 @@ def vehicle(slug):
 
 
 @app.route("/heads/<slug>")
+@page_cache.cached
 def head(slug):
     head = get_head_by_slug(slug)
     if not head:
         abort(404)
 
-    specs_left, specs_right = build_specs(head["fields"])
+    specs_left, specs_right = get_specs(head)
 
     return render_template(
         "head.html",
@@ -244,6 +346,7 @@ def head(slug):
     )
     
 @app.route("/grips/<slug>")
+@page_cache.cached
 def grip_products(slug):
     grips_category = get_grips_categories_by_slug(slug)
     if not grips_category:
@@ -256,20 +359,91 @@ def grip_products(slug):
 # -----------------------
 
 @app.route("/about-us")
+@page_cache.cached
 def about_us():
     return render_template("about-us.html")
 
 
 @app.route("/contact")
+@page_cache.cached
 def contact():
     return render_template("contact.html")
 
 
 @app.route("/terms-and-conditions")
+@page_cache.cached
 def terms_and_conditions():
     return render_template("terms-and-conditions.html")
 
 
+# -----------------------
+# Search
+# -----------------------
+
+SEARCH_LIMIT = 20
+SEARCH_MAX_LENGTH = 100
+
+
+SEARCH_UNAVAILABLE = "Search is temporarily unavailable."
+
+
+def search_catalog(query):
+    """
+    Recherche dans l'index plein texte du replica SQLite (construit à la sync).
+    Retourne None si l'index n'est pas disponible.
+    """
+    if not query:
+        return []
+    if not replica.available():
+        return None
+    try:
+        return replica.search(query, limit=SEARCH_LIMIT)
+    except sqlite3.Error as e:
+        app.logger.error(f"❌ Erreur recherche : {e}")
+        return None
+
+
+@app.route("/search")
+def search():
+    query = request.args.get("q", "").strip()[:SEARCH_MAX_LENGTH]
+    results = search_catalog(query)
+    if results is None:
+        abort(503, description=SEARCH_UNAVAILABLE)
+    return render_template("search.html", query=query, results=results)
+
+
+@app.route("/search.json")
+def search_json():
+    query = request.args.get("q", "").strip()[:SEARCH_MAX_LENGTH]
+    results = search_catalog(query)
+    if results is None:
+        return jsonify({"error": SEARCH_UNAVAILABLE}), 503
+    return jsonify({
+        "query": query,
+        "results": [{**result, "snippet": str(result["snippet"])} for result in results],
+    })
+
+
+# -----------------------
+# API
+# -----------------------
+
+@app.route("/api/vehicles")
+def api_vehicles():
+    """Véhicules filtrés, compteurs de facettes et cartes HTML à afficher."""
+    result = query_vehicles(vehicle_filters(request.args))
+    return jsonify({
+        "count": result.count,
+        "slugs": [vehicle["fields"].get("slug") for vehicle in result.records],
+        "facets": result.facets,
+        "html": render_template("vehicle-cards.html", matching=result.records),
+    })
+
+
+SUBSCRIBE_RATE_LIMIT = 10
+SUBSCRIBE_RATE_WINDOW = 3600
+
+
 @app.route("/subscribe", methods=["POST"])
 def subscribe():
     email = request.form.get("email")
@@ -281,31 +455,35 @@ def subscribe():
     if not re.match(email_regex, email):
         return jsonify({"status": "error", "message": "Invalid email address"}), 400
 
-    # 2. Rate Limiting (IP based, 10 requests per hour)
+    # 2. Rate Limiting (IP based, 10 requests per fixed hour window)
     ip = request.headers.get('X-Forwarded-For', request.remote_addr)
-    rate_key = f"rate_limit_{ip}"
-    requests_count = cache.get(rate_key) or 0
-    
-    if requests_count >= 10:
-        return jsonify({"status": "error", "message": "Too many requests. Please try again later."}), 429
-    
-    cache.set(rate_key, requests_count + 1, timeout=3600)
+    # Une clé par fenêtre : un client bloqué ne prolonge pas son blocage
+    rate_key = f"rate_limit_{ip}_{int(time.time() // SUBSCRIBE_RATE_WINDOW)}"
+    too_many = jsonify({"status": "error", "message": "Too many requests. Please try again later."}), 429
+
+    # Les requêtes refusées ne sont pas comptées
+    if (cache.get(rate_key) or 0) >= SUBSCRIBE_RATE_LIMIT:
+        return too_many
+    if not cache.add(rate_key, 1, timeout=SUBSCRIBE_RATE_WINDOW):
+        # inc sur le backend : compteur partagé par les workers (atomique sur Redis)
+        if (cache.cache.inc(rate_key) or 0) > SUBSCRIBE_RATE_LIMIT:
+            return too_many
 
-    connection = None
-    tunnel = None
     try:
-        connection, tunnel = get_db_connection()
-        cursor = connection.cursor()
-        
-        # Check if email already exists
-        cursor.execute("SELECT id FROM newsletter_subscribers WHERE email = %s", (email,))
-        if cursor.fetchone():
-            return jsonify({"status": "error", "message": "You are already subscribed!"}), 400
-            
-        # Insert new subscriber
-        cursor.execute("INSERT INTO newsletter_subscribers (email) VALUES (%s)", (email,))
-        connection.commit()
-        
+        with db_pool.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                # Check if email already exists
+                cursor.execute("SELECT id FROM newsletter_subscribers WHERE email = %s", (email,))
+                if cursor.fetchone():
+                    return jsonify({"status": "error", "message": "You are already subscribed!"}), 400
+
+                # Insert new subscriber
+                cursor.execute("INSERT INTO newsletter_subscribers (email) VALUES (%s)", (email,))
+                connection.commit()
+            finally:
+                cursor.close()
+
         return jsonify({"status": "success", "message": "Thank you for subscribing!"}), 200
         
     except Error as e:
@@ -314,12 +492,6 @@ def subscribe():
     except Exception as e:
         app.logger.error(f"Unexpected error: {e}")
         return jsonify({"status": "error", "message": "An unexpected error occurred."}), 500
-    finally:
-        if connection:
-            cursor.close()
-            connection.close()
-        if tunnel:
-            tunnel.stop()
 
 
 # -------------------------------------------------
@@ -329,17 +501,48 @@ def subscribe():
 @app.route("/admin/cache/clear", methods=["POST"])
 def clear_cache():
     require_admin_token()
-    cache.clear()
-    return jsonify({"status": "Cache cleared"}), 200
+    # Nouvelle génération : toutes les clés de tous les workers sont périmées
+    generation = caching.bump_generation()
+    page_cache.clear()
+    return jsonify({"status": "Cache cleared", "generation": generation}), 200
+
+
+@app.route("/admin/cache/invalidate", methods=["POST"])
+def invalidate_cache():
+    """Invalide puis recharge seulement les clés des records modifiés (envoyés par la sync)."""
+    require_admin_token()
+    changes = (request.get_json(silent=True) or {}).get("changes", {})
+    keys = invalidate_records(changes)
+    # Les pages rendues incluent les listes : nouvelle version du catalogue
+    page_cache.invalidate()
+    if keys == ALL_KEYS:
+        return jsonify({"status": "Cache generation bumped", "keys": keys}), 200
+    return jsonify({"status": f"{len(keys)} cache keys invalidated", "keys": keys}), 200
+
+
+@app.route("/admin/cache/stats")
+def cache_stats():
+    """Compteurs du cache de ce worker (tier local / backend / fetch)."""
+    require_admin_token()
+    return jsonify({"pid": os.getpid(), **caching.cache_stats()}), 200
 
 
 @app.route("/admin/cache/clear/<key>", methods=["POST"])
 def clear_cache_key(key):
     require_admin_token()
-    cache.delete(key)
+    caching.forget(cache, [key])
+    # Les pages rendues dépendent de cette clé : nouvelle version du catalogue
+    page_cache.invalidate()
     return jsonify({"status": f"Cache key {key} cleared"}), 200
 
 
+# -------------------------------------------------
+# Warm du cache (après l'enregistrement des routes)
+# -------------------------------------------------
+
+if os.getenv("FLASK_ENV") == "production":
+    start_warm_cache()
+
 # -------------------------------------------------
 # Run
 # -------------------------------------------------
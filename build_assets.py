@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Static Assets Build
+
+Writes content-hashed copies of the stylesheets and scripts to static/dist:
+- css/styles.css with its local @import files inlined
+- every script of js/src, plus js/bundle.js concatenating the scripts
+  loaded by layout.html
+Each file gets precompressed .gz (and .br if brotli is installed) siblings,
+and static/dist/manifest.json maps the logical names to the hashed files.
+
+Files of the previous build are kept, so pages cached before a deploy still
+find their assets; older ones are deleted.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+from utils.assets import (
+    BROTLI_AVAILABLE, BUNDLE_JS, BUNDLE_SOURCES, DIST_DIR, MANIFEST_NAME,
+    load_manifest, write_compressed, write_file,
+)
+
+DEFAULT_STATIC_FOLDER = os.getenv("STATIC_FOLDER") or "static"
+
+# Entry stylesheet (its local @import files are inlined)
+STYLESHEETS = ["css/styles.css"]
+SCRIPTS_DIR = "js/src"
+
+CSS_IMPORT = re.compile(r"""@import\s+url\(\s*["']?([^"')]+)["']?\s*\)\s*;""")
+
+
+def inline_css(path, remote_imports):
+    """CSS of `path` with local @import inlined; remote ones are collected."""
+    def replace(match):
+        url = match.group(1)
+        if url.startswith(("http://", "https://", "//")):
+            remote_imports.append(match.group(0))
+            return ""
+        return inline_css(path.parent / url, remote_imports)
+
+    return CSS_IMPORT.sub(replace, path.read_text(encoding="utf-8"))
+
+
+def build_stylesheet(static_dir, name):
+    remote_imports = []
+    css = inline_css(static_dir / name, remote_imports)
+    # @import must come before every other rule
+    return "\n".join(remote_imports + [css]).encode("utf-8")
+
+
+def build_bundle(static_dir):
+    parts = []
+    for name in BUNDLE_SOURCES:
+        parts.append(f"/* {name} */\n" + (static_dir / name).read_text(encoding="utf-8"))
+    # ";" guards against a file ending without a semicolon
+    return "\n;\n".join(parts).encode("utf-8")
+
+
+def hashed_name(name, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, ext = os.path.splitext(name)
+    return f"{DIST_DIR}/{stem}.{digest}{ext}"
+
+
+def write_asset(static_dir, name, content):
+    """Write the hashed file and its compressed siblings. Returns the hashed name."""
+    hashed = hashed_name(name, content)
+    path = static_dir / hashed
+    if not path.exists():
+        write_file(path, content)
+        write_compressed(path, content)
+        print(f"  ✓ {name} -> {hashed}")
+    else:
+        print(f"  = {name} (unchanged)")
+    return hashed
+
+
+def prune(static_dir, keep):
+    """Delete dist files that belong to neither the new nor the previous build."""
+    dist_dir = static_dir / DIST_DIR
+    removed = 0
+    for path in dist_dir.rglob("*"):
+        if not path.is_file() or path.name == MANIFEST_NAME:
+            continue
+        relative = path.relative_to(static_dir).as_posix()
+        base = re.sub(r"\.(gz|br)$", "", relative)
+        if base not in keep:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def build(static_folder):
+    static_dir = Path(static_folder)
+    previous = load_manifest(static_folder)
+    manifest = {}
+
+    print(f"Building assets in {static_dir / DIST_DIR}")
+    for name in STYLESHEETS:
+        manifest[name] = write_asset(static_dir, name, build_stylesheet(static_dir, name))
+
+    for path in sorted((static_dir / SCRIPTS_DIR).glob("*.js")):
+        name = path.relative_to(static_dir).as_posix()
+        manifest[name] = write_asset(static_dir, name, path.read_bytes())
+
+    manifest[BUNDLE_JS] = write_asset(static_dir, BUNDLE_JS, build_bundle(static_dir))
+
+    write_file(
+        static_dir / DIST_DIR / MANIFEST_NAME,
+        json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8")
+    )
+
+    removed = prune(static_dir, set(manifest.values()) | set(previous.values()))
+    print(f"\n✓ {len(manifest)} assets, {removed} old files removed")
+    if not BROTLI_AVAILABLE:
+        print("  (brotli not installed: .br files skipped)")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build fingerprinted static assets")
+    parser.add_argument(
+        "--static", default=DEFAULT_STATIC_FOLDER,
+        help=f"static folder of the app (default: {DEFAULT_STATIC_FOLDER})"
+    )
+    args = parser.parse_args()
+    build(args.static)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Static Site Export
+
+Renders every catalog page (lists, static pages and every vehicle, head and
+grip slug) with the app's templates and writes them as HTML files, so a
+front web server can serve them straight from disk. /subscribe, /search
+and the admin endpoints stay dynamic.
+
+Each page is written as <path>/index.html, optionally with precompressed
+.gz and .br siblings (gzip_static / brotli_static).
+"""
+
+import argparse
+import os
+import shutil
+import time
+from pathlib import Path
+
+from app import app
+from utils.airtable import get_grips_categories, get_heads, get_vehicles
+from utils.assets import BROTLI_AVAILABLE, write_compressed, write_file
+
+DEFAULT_OUTPUT_DIR = os.getenv("EXPORT_DIR", "export")
+
+# Paths that must never be exported, even if they answer GET
+EXCLUDED_PREFIXES = ("/admin", "/static", "/search")
+
+
+def list_paths():
+    """Every GET page without arguments, plus one page per catalog slug."""
+    paths = []
+    for rule in app.url_map.iter_rules():
+        if "GET" not in rule.methods or rule.arguments:
+            continue
+        if rule.rule.startswith(EXCLUDED_PREFIXES):
+            continue
+        paths.append(rule.rule)
+
+    for prefix, records in (
+        ("/vehicles", get_vehicles()),
+        ("/heads", get_heads()),
+        ("/grips", get_grips_categories()),
+    ):
+        for record in records:
+            slug = record["fields"].get("slug")
+            if slug:
+                paths.append(f"{prefix}/{slug}")
+
+    return sorted(set(paths))
+
+
+def page_file(output_dir, path):
+    """/ -> index.html, /vehicles/etrike -> vehicles/etrike/index.html"""
+    return output_dir / path.strip("/") / "index.html"
+
+
+def write_page(file_path, body, compress=False):
+    """Write the page and its compressed siblings. Returns the number of files."""
+    write_file(file_path, body)
+    written = 1
+
+    if compress:
+        written += write_compressed(file_path, body)
+
+    return written
+
+
+def publish(build_dir, output_dir):
+    """Replace output_dir with build_dir, keeping the old export for a moment."""
+    old_dir = output_dir.with_name(output_dir.name + ".old")
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    if output_dir.exists():
+        output_dir.rename(old_dir)
+    build_dir.rename(output_dir)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+
+
+def export(output_dir, compress=False):
+    """Render every page into output_dir. Returns True if every page succeeded."""
+    output_dir = Path(output_dir)
+    build_dir = output_dir.with_name(output_dir.name + ".tmp")
+    if build_dir.exists():
+        shutil.rmtree(build_dir)
+    build_dir.mkdir(parents=True)
+
+    started = time.monotonic()
+    paths = list_paths()
+    pages = files = 0
+    failed = []
+
+    with app.test_client() as client:
+        for path in paths:
+            response = client.get(path)
+            if response.status_code != 200:
+                print(f"  ❌ {path}: HTTP {response.status_code}")
+                failed.append(path)
+                continue
+            if response.mimetype != "text/html":
+                # JSON endpoints stay dynamic
+                continue
+
+            files += write_page(page_file(build_dir, path), response.get_data(), compress)
+            pages += 1
+            print(f"  ✓ {path}")
+
+        # Page served by the front server for unknown paths
+        response = client.get("/__export_not_found__")
+        if response.status_code == 404:
+            files += write_page(build_dir / "404.html", response.get_data(), compress)
+
+    if failed:
+        shutil.rmtree(build_dir)
+        print(f"\n❌ {len(failed)} page(s) failed, export not published")
+        return False
+
+    publish(build_dir, output_dir)
+    print(f"\n✓ Exported {pages} pages ({files} files) to {output_dir} "
+          f"in {time.monotonic() - started:.1f}s")
+    if compress and not BROTLI_AVAILABLE:
+        print("  (brotli not installed: .br files skipped)")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the catalog pages as static HTML")
+    parser.add_argument(
+        "--output", default=DEFAULT_OUTPUT_DIR,
+        help=f"directory to write the pages to (default: {DEFAULT_OUTPUT_DIR})"
+    )
+    parser.add_argument(
+        "--compress", action="store_true",
+        help="also write precompressed .gz (and .br if brotli is installed) files"
+    )
+    args = parser.parse_args()
+
+    if not export(args.output, compress=args.compress):
+        raise SystemExit(1)
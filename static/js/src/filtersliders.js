@@ -3,14 +3,17 @@
     // INIT
     // =========================
 
+    const CARD_SELECTOR = ".categories-solutions-categories-categorywrapper";
+    const FILTER_DELAY = 150;
+
     let sliders = [];
-    let vehicles = [];
+    let container = null;
+    let controller = null;
+    let filterTimeout = null;
 
     window.initFilterSliders = function () {
         const sliderContainers = document.querySelectorAll(".slider-container");
-        vehicles = Array.from(document.querySelectorAll(
-            ".categories-solutions-categories-categorywrapper"
-        ));
+        container = document.querySelector(".categories-solutions-categories[data-api-url]");
 
         sliders = [];
 
@@ -18,8 +21,7 @@
             sliders.push(initSlider(container));
         });
 
-        // premier filtrage APRÈS init complète
-        applyFilters();
+        // les cartes reçues sont déjà filtrées par le serveur
     };
 
     // =========================
@@ -38,7 +40,7 @@
             output.textContent = value;
             updateDescription(container, value);
 
-            applyFilters();
+            scheduleFilters();
         };
 
         slider.addEventListener("input", update);
@@ -54,26 +56,74 @@
     }
 
     // =========================
-    // AND FILTER LOGIC
+    // SERVER-SIDE FILTERING
     // =========================
 
-    function applyFilters() {
-        vehicles.forEach((vehicle) => {
-            const isVisible = sliders.every((slider) => {
-                if (!slider) return true;
-                const { filterKey, getValue } = slider;
-                const vehicleValue = parseInt(vehicle.dataset[filterKey], 10);
+    function scheduleFilters() {
+        clearTimeout(filterTimeout);
+        filterTimeout = setTimeout(applyFilters, FILTER_DELAY);
+    }
 
-                if (Number.isNaN(vehicleValue)) return false;
+    function filterParams() {
+        // chaque slider est un minimum : <facette>_min
+        const params = new URLSearchParams();
+        sliders.forEach((slider) => {
+            if (!slider) return;
+            params.set(`${slider.filterKey}_min`, slider.getValue());
+        });
+        return params;
+    }
 
-                return getValue() <= vehicleValue;
+    function applyFilters() {
+        if (!container) return;
+
+        const params = filterParams();
+
+        // seule la dernière requête compte
+        if (controller) controller.abort();
+        controller = new AbortController();
+
+        fetch(`${container.dataset.apiUrl}?${params}`, {
+            signal: controller.signal,
+            headers: { Accept: "application/json" }
+        })
+            .then((response) => {
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                return response.json();
+            })
+            .then((data) => {
+                renderCards(data.html);
+                // l'URL garde les filtres (rechargement, partage)
+                history.replaceState(history.state, "", `${location.pathname}?${params}`);
+            })
+            .catch((error) => {
+                if (error.name !== "AbortError") console.error("Filtres :", error);
             });
+    }
 
-            if (isVisible) {
-                show(vehicle);
-            } else {
-                hide(vehicle);
+    function renderCards(html) {
+        const template = document.createElement("template");
+        template.innerHTML = html;
+
+        const current = new Map(
+            Array.from(container.querySelectorAll(CARD_SELECTOR)).map((card) => [card.dataset.slug, card])
+        );
+        const visible = new Set();
+
+        // cartes reçues, dans l'ordre du catalogue (les existantes sont réutilisées)
+        template.content.querySelectorAll(CARD_SELECTOR).forEach((card) => {
+            let el = current.get(card.dataset.slug);
+            if (!el) {
+                el = card;
+                el.classList.add("filterslider-is-hidden");
             }
+            visible.add(el);
+            container.appendChild(el);
+            show(el);
+        });
+
+        current.forEach((el) => {
+            if (!visible.has(el)) hide(el);
         });
     }
 
@@ -4,20 +4,31 @@ Airtable to MySQL Sync Script
 
 Syncs Airtable tables to MySQL database and downloads images with thumbnails.
 Preserves Airtable API attachment structure with local URLs.
+After each sync, the tables are also published as a local SQLite replica.
 """
 
 import os
 import json
+import argparse
+import hashlib
 import requests
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import namedtuple
+from functools import partial
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from pyairtable import Api
 import shutil
+import sqlite_utils
 import mysql.connector
 from mysql.connector import Error
 from sshtunnel import SSHTunnelForwarder
 
-from utils.cache_clearer import clear_cache
+from utils import replica
+from utils.cache_clearer import clear_cache, invalidate_records
 
 # Load environment variables
 load_dotenv()
@@ -41,12 +52,60 @@ USE_SSH_TUNNEL = os.getenv("USE_SSH_TUNNEL", "false").lower() == "true"
 IMAGE_STORE_PATH = "static/images/airtable"
 STATIC_URL_PREFIX = "/static/images/airtable"
 
+# Local sync state (kept out of the static folder)
+SYNC_STATE_PATH = ".sync"
+MANIFEST_PATH = os.path.join(SYNC_STATE_PATH, "download_manifest.json")
+
 # Tables to sync
-TABLES = ["vehicles", "heads", "grips", "configs"]
+# (grips is the legacy grip table; the site reads grips_categories and grip_products)
+TABLES = ["vehicles", "heads", "grips", "configs", "grips_categories", "grip_products"]
 
 # Thumbnail sizes to download
 THUMBNAIL_SIZES = ["small", "large", "full"]
 
+# Incremental sync: field fetched per table to list record ids cheaply
+# (deletion detection), and overlap applied to the high-water mark for
+# clock skew. Tables without a probe field fetch every field.
+ID_PROBE_FIELDS = {
+    "vehicles": "name", "heads": "name", "grips": "name", "configs": "name",
+    "grips_categories": "name", "grip_products": "name",
+}
+HIGH_WATER_OVERLAP = timedelta(minutes=5)
+
+# Shadow-table swap: suffixes of the table being built and of the
+# previous generation kept for rollback
+SHADOW_SUFFIX = "__shadow"
+PREVIOUS_SUFFIX = "__prev"
+
+# Linked-record fields reported with changed records (cache invalidation)
+CHANGE_LINK_FIELDS = ["vehicle", "category"]
+
+# Full-text search index of the replica: indexed tables, the kind shown
+# with their results and the page showing them. Configs and grip products
+# have no page of their own: they link to the page of their parent record
+# (found through link_field), products with an anchor.
+SearchSource = namedtuple("SearchSource", ["kind", "url_prefix", "parent_table", "link_field", "anchor"])
+SEARCH_TABLES = {
+    "vehicles": SearchSource("vehicles", "/vehicles", None, None, None),
+    "heads": SearchSource("heads", "/heads", None, None, None),
+    "grips_categories": SearchSource("grips", "/grips", None, None, None),
+    "configs": SearchSource("configs", "/vehicles", "vehicles", "vehicle", None),
+    "grip_products": SearchSource("grip products", "/grips", "grips_categories", "category", "grip-{id}"),
+}
+SEARCH_COLUMNS = replica.SEARCH_COLUMNS
+
+# Rows per multi-row INSERT
+SYNC_BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", "100"))
+
+# Concurrent downloads
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "8"))
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "5"))
+
+# Responsive variants built from each downloaded image (srcset widths),
+# in order of preference; formats Pillow cannot encode are skipped
+VARIANT_WIDTHS = [int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "480,960,1600").split(",")]
+VARIANT_FORMATS = {"avif": {"quality": 50}, "webp": {"quality": 75, "method": 6}}
+
 
 def get_mysql_connection():
     """Create and return a MySQL connection."""
@@ -63,6 +122,29 @@ def get_mysql_connection():
         raise
 
 
+# Virtual columns extracted from the JSON `fields` column, so readers can
+# filter and sort through secondary indexes instead of scanning the table.
+GENERATED_COLUMNS = {
+    "slug": "VARCHAR(255) GENERATED ALWAYS AS "
+            "(JSON_VALUE(fields, '$.slug' RETURNING CHAR(255))) VIRTUAL",
+    "sort_order": "DECIMAL(10,2) GENERATED ALWAYS AS "
+                  "(IFNULL(JSON_VALUE(fields, '$.order' RETURNING DECIMAL(10,2)), 999)) VIRTUAL",
+}
+
+# Secondary indexes on every synced table
+INDEXES = {
+    "idx_slug": "(slug)",
+    "idx_sort_order": "(sort_order)",
+}
+
+# Extra indexes per table (multi-valued index for config -> vehicle links)
+TABLE_INDEXES = {
+    "configs": {
+        "idx_vehicle": "((CAST(fields->'$.vehicle' AS CHAR(32) ARRAY)))",
+    },
+}
+
+
 def create_table_if_not_exists(cursor, table_name):
     """Create table with flexible JSON structure if it doesn't exist."""
     cursor.execute(f"""
@@ -73,38 +155,343 @@ def create_table_if_not_exists(cursor, table_name):
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
         )
     """)
+    ensure_indexes(cursor, table_name)
+
+
+def ensure_indexes(cursor, table_name):
+    """Add missing generated columns and secondary indexes to a table."""
+    cursor.execute(
+        "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table_name,)
+    )
+    existing_columns = {row[0] for row in cursor.fetchall()}
+
+    for column, definition in GENERATED_COLUMNS.items():
+        if column not in existing_columns:
+            print(f"  Adding column {column} to {table_name}")
+            cursor.execute(f"ALTER TABLE `{table_name}` ADD COLUMN `{column}` {definition}")
+
+    cursor.execute(
+        "SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table_name,)
+    )
+    existing_indexes = {row[0] for row in cursor.fetchall()}
+
+    indexes = {**INDEXES, **TABLE_INDEXES.get(table_name, {})}
+    for index_name, definition in indexes.items():
+        if index_name not in existing_indexes:
+            print(f"  Adding index {index_name} to {table_name}")
+            cursor.execute(f"ALTER TABLE `{table_name}` ADD INDEX `{index_name}` {definition}")
+
+
+def chunks(items, size=SYNC_BATCH_SIZE):
+    """Split a list into lists of at most `size` items."""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def create_sync_state_table(cursor):
+    """Create the table holding the per-table high-water marks."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS `sync_state` (
+            table_name VARCHAR(64) PRIMARY KEY,
+            high_water DATETIME NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """)
+
 
+def get_high_water(cursor, table_name):
+    """Return the UTC datetime of the last successful sync of a table, or None."""
+    cursor.execute("SELECT high_water FROM `sync_state` WHERE table_name = %s", (table_name,))
+    row = cursor.fetchone()
+    return row[0].replace(tzinfo=timezone.utc) if row else None
 
-def download_file(url, save_path):
+
+def set_high_water(cursor, table_name, high_water):
+    """Store the high-water mark of a table (committed with the synced rows)."""
+    cursor.execute("""
+        INSERT INTO `sync_state` (table_name, high_water)
+        VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE high_water = VALUES(high_water)
+    """, (table_name, high_water.astimezone(timezone.utc).replace(tzinfo=None)))
+
+
+def modified_since_formula(since):
+    """Airtable formula matching records modified after `since`."""
+    since = (since - HIGH_WATER_OVERLAP).astimezone(timezone.utc)
+    return f"IS_AFTER(LAST_MODIFIED_TIME(), '{since.strftime('%Y-%m-%dT%H:%M:%S.000Z')}')"
+
+
+def create_http_session(pool_size=DOWNLOAD_WORKERS, retries=DOWNLOAD_RETRIES):
+    """
+    Create a pooled HTTP session shared by all downloads.
+    Retries 429 and 5xx responses with exponential backoff, honouring Retry-After.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def download_file(url, save_path, session=None):
     """Download a file from URL to the specified path."""
+    http = session or requests
+    tmp_path = f"{save_path}.part"
     try:
-        response = requests.get(url, stream=True, timeout=30)
+        response = http.get(url, stream=True, timeout=30)
         response.raise_for_status()
         
         Path(save_path).parent.mkdir(parents=True, exist_ok=True)
         
-        with open(save_path, 'wb') as f:
+        # Write aside then rename, so a failed download never leaves a partial file
+        with open(tmp_path, 'wb') as f:
             for chunk in response.iter_content(chunk_size=8192):
                 f.write(chunk)
+        os.replace(tmp_path, save_path)
         
         return True
     except Exception as e:
         print(f"  Error downloading {url}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         return False
 
 
-def process_attachment(attachment, table_name, record_id):
+# EXIF orientations that swap width and height (exif_transpose rotates them)
+EXIF_ORIENTATION = 0x0112
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def build_variants(source_path, dest_dir, dest_url):
+    """
+    Resize and re-encode an image at VARIANT_WIDTHS in each supported format.
+    Existing variants newer than the source are reused.
+    Returns {"width", "height", "sources": {format: [{"url", "width", "height"}]}},
+    or None when the file is not a still image or Pillow is not installed.
+    """
+    try:
+        from PIL import Image, ImageOps, UnidentifiedImageError, features
+    except ImportError:
+        return None
+
+    formats = [fmt for fmt in VARIANT_FORMATS if features.check(fmt)]
+    if not formats:
+        return None
+
+    try:
+        image = Image.open(source_path)
+    except (UnidentifiedImageError, OSError):
+        return None
+
+    with image:
+        if getattr(image, "is_animated", False):
+            return None
+
+        # Size as displayed, read from the header: no pixel is decoded yet
+        width, height = image.size
+        if image.getexif().get(EXIF_ORIENTATION) in ROTATED_ORIENTATIONS:
+            width, height = height, width
+
+        stem = Path(source_path).stem
+        source_mtime = os.path.getmtime(source_path)
+        sources = {fmt: [] for fmt in formats}
+        missing = {}  # (width, height) -> [(format, path)]
+
+        # Never upscale: widths above the original collapse onto it
+        for variant_width in sorted({min(w, width) for w in VARIANT_WIDTHS}):
+            variant_height = round(height * variant_width / width)
+            for fmt in formats:
+                name = f"{stem}-{variant_width}.{fmt}"
+                path = os.path.join(dest_dir, name)
+                if not (os.path.exists(path) and os.path.getmtime(path) >= source_mtime):
+                    missing.setdefault((variant_width, variant_height), []).append((fmt, path))
+                sources[fmt].append({
+                    "url": f"{dest_url}/{name}",
+                    "width": variant_width,
+                    "height": variant_height
+                })
+
+        # Unchanged image: every variant is reused without decoding it
+        if missing:
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+            Path(dest_dir).mkdir(parents=True, exist_ok=True)
+            for size, targets in missing.items():
+                resized = image.resize(size, Image.LANCZOS)
+                for fmt, path in targets:
+                    tmp_path = f"{path}.part"
+                    resized.save(tmp_path, format=fmt.upper(), **VARIANT_FORMATS[fmt])
+                    os.replace(tmp_path, path)
+
+    return {"width": width, "height": height, "sources": sources}
+
+
+def file_sha256(path):
+    """Return the SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadManifest:
+    """
+    Persistent record of downloaded files, keyed by attachment id and size
+    ("main", "small", ...). A file whose Airtable fingerprint (filename,
+    byte size or dimensions) is unchanged and which is still on disk with
+    the recorded size is not downloaded again.
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def matches(self, key, fingerprint, save_path):
+        entry = self.entries.get(key)
+        if not entry or entry["fingerprint"] != fingerprint or entry["path"] != save_path:
+            return False
+        return os.path.exists(save_path) and os.path.getsize(save_path) == entry["size"]
+
+    def record(self, key, fingerprint, save_path):
+        self.entries[key] = {
+            "fingerprint": fingerprint,
+            "path": save_path,
+            "size": os.path.getsize(save_path),
+            "sha256": file_sha256(save_path),
+        }
+
+    def save(self):
+        """Write the manifest aside then rename it into place."""
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class DownloadQueue:
+    """
+    Collects the files to download while records are processed, then
+    downloads them concurrently with a bounded pool of workers.
+    Files already listed in the manifest are skipped.
+    A job may also carry a `process` step (e.g. image variants), run by the
+    workers once the file is on disk, downloaded or not.
+    """
+
+    def __init__(self, session, manifest=None, workers=DOWNLOAD_WORKERS):
+        self.session = session
+        self.manifest = manifest
+        self.workers = workers
+        self.jobs = []
+        self.downloaded = 0
+        self.skipped = 0
+        self.failed = []
+
+    def add(self, url, save_path, on_success=None, key=None, fingerprint=None, process=None):
+        """
+        Queue a download; on_success runs (in the caller's thread) once it is on disk.
+        With a manifest key/fingerprint, unchanged files succeed immediately.
+        With `process`, on_success receives process(save_path) instead.
+        """
+        if self.manifest is not None and key and self.manifest.matches(key, fingerprint, save_path):
+            self.skipped += 1
+            if process:
+                # Already on disk: only the processing step is queued
+                self.jobs.append((None, save_path, on_success, key, fingerprint, process))
+            elif on_success:
+                on_success()
+            return
+        self.jobs.append((url, save_path, on_success, key, fingerprint, process))
+
+    def _work(self, url, save_path, process):
+        """Worker side of a job: download (unless on disk), then process."""
+        if url is not None and not download_file(url, save_path, self.session):
+            return False, None
+        if not process:
+            return True, None
+        try:
+            return True, process(save_path)
+        except Exception as e:
+            print(f"  Error processing {save_path}: {e}")
+            return True, None
+
+    def run(self):
+        """Download every queued file and report progress."""
+        jobs, self.jobs = self.jobs, []
+        
+        # Jobs writing the same file run once (workers would race on it);
+        # every job of the group gets the result
+        groups = {}
+        for job in jobs:
+            groups.setdefault(job[1], []).append(job)
+        total = len(groups)
+        if not total:
+            return
+        
+        def leader(group):
+            # A download, if any job of the group needs one
+            return next((job for job in group if job[0] is not None), group[0])
+        
+        to_download = sum(1 for group in groups.values() if leader(group)[0] is not None)
+        print(f"\nDownloading {to_download} files, processing {total - to_download} "
+              f"unchanged ones ({self.workers} workers)...")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {}
+            for save_path, group in groups.items():
+                url, _, _, _, _, process = leader(group)
+                process = process or next((job[5] for job in group if job[5]), None)
+                futures[executor.submit(self._work, url, save_path, process)] = group
+            for done, future in enumerate(as_completed(futures), start=1):
+                group = futures[future]
+                ok, result = future.result()
+                if ok and leader(group)[0] is not None:
+                    self.downloaded += 1
+                for url, save_path, on_success, key, fingerprint, process in group:
+                    if not ok:
+                        self.failed.append((url, save_path))
+                        continue
+                    if url is not None and self.manifest is not None and key:
+                        self.manifest.record(key, fingerprint, save_path)
+                    if on_success and process:
+                        on_success(result)
+                    elif on_success:
+                        on_success()
+                print(f"  [{done}/{total}] {'' if ok else 'FAILED '}{group[0][1]}")
+
+
+def process_attachment(attachment, table_name, record_id, downloads):
     """
-    Process a single attachment: download main image and thumbnails.
-    Returns modified attachment with local URLs.
+    Process a single attachment: queue main image and thumbnails downloads.
+    Returns a copy of the attachment whose URLs switch to local ones
+    as each download succeeds (remote URLs are kept on failure), and which
+    gets the responsive variants of the main image under "variants".
     """
     attachment_id = attachment.get("id", "unknown")
     filename = attachment.get("filename", "image.jpg")
     original_url = attachment.get("url")
     
-    # Base path for this attachment
-    base_path = os.path.join(IMAGE_STORE_PATH, table_name, record_id)
-    base_url = f"{STATIC_URL_PREFIX}/{table_name}/{record_id}"
+    # Base path for this attachment: one folder per attachment, so two
+    # attachments with the same filename never share a file
+    base_path = os.path.join(IMAGE_STORE_PATH, table_name, record_id, attachment_id)
+    base_url = f"{STATIC_URL_PREFIX}/{table_name}/{record_id}/{attachment_id}"
     
     # Create a copy of the attachment to modify
     processed = attachment.copy()
@@ -112,11 +499,22 @@ def process_attachment(attachment, table_name, record_id):
     # Download main image
     if original_url:
         main_save_path = os.path.join(base_path, filename)
-        if download_file(original_url, main_save_path):
+        
+        def use_local_main(variants):
             processed["url"] = f"{base_url}/{filename}"
-            print(f"  Downloaded: {filename}")
-        else:
-            print(f"  Failed to download main image: {filename}")
+            if variants:
+                processed["variants"] = variants
+        
+        downloads.add(
+            original_url, main_save_path, use_local_main,
+            key=f"{attachment_id}/main",
+            fingerprint=f"{filename}:{attachment.get('size')}",
+            process=partial(
+                build_variants,
+                dest_dir=os.path.join(base_path, "variants"),
+                dest_url=f"{base_url}/variants"
+            )
+        )
     
     # Process thumbnails
     thumbnails = attachment.get("thumbnails", {})
@@ -132,23 +530,28 @@ def process_attachment(attachment, table_name, record_id):
                 thumb_save_path = os.path.join(base_path, "thumbnails", size, filename)
                 thumb_local_url = f"{base_url}/thumbnails/{size}/{filename}"
                 
-                if download_file(thumb_url, thumb_save_path):
+                # Keep original structure until the download succeeds
+                processed_thumbnails[size] = thumb_data
+                
+                def use_local_thumb(size=size, thumb_data=thumb_data, thumb_local_url=thumb_local_url):
                     processed_thumbnails[size] = {
                         "url": thumb_local_url,
                         "width": thumb_data.get("width"),
                         "height": thumb_data.get("height")
                     }
-                    print(f"    Thumbnail ({size}): {filename}")
-                else:
-                    # Keep original structure but note failure
-                    processed_thumbnails[size] = thumb_data
+                
+                downloads.add(
+                    thumb_url, thumb_save_path, use_local_thumb,
+                    key=f"{attachment_id}/{size}",
+                    fingerprint=f"{filename}:{thumb_data.get('width')}x{thumb_data.get('height')}"
+                )
         
         processed["thumbnails"] = processed_thumbnails
     
     return processed
 
 
-def process_attachments_in_fields(fields, table_name, record_id):
+def process_attachments_in_fields(fields, table_name, record_id, downloads):
     """
     Iterate through all fields and process any attachment arrays.
     Returns modified fields with local URLs.
@@ -164,7 +567,7 @@ def process_attachments_in_fields(fields, table_name, record_id):
                 print(f"  Processing attachment field: {key}")
                 processed_attachments = []
                 for attachment in value:
-                    processed = process_attachment(attachment, table_name, record_id)
+                    processed = process_attachment(attachment, table_name, record_id, downloads)
                     processed_attachments.append(processed)
                 processed_fields[key] = processed_attachments
             else:
@@ -175,49 +578,135 @@ def process_attachments_in_fields(fields, table_name, record_id):
     return processed_fields
 
 
-def sync_table(table_name, api, cursor):
-    """Sync a single table from Airtable to MySQL."""
+def load_json(value):
+    """Decode a JSON column value (returned as str, bytes or already decoded)."""
+    return json.loads(value) if isinstance(value, (str, bytes, bytearray)) else value
+
+
+def fetch_stored_fields(cursor, table_name, record_ids):
+    """Return {id: fields} for the given ids currently stored in a table."""
+    stored = {}
+    for batch in chunks(list(record_ids)):
+        format_strings = ','.join(['%s'] * len(batch))
+        cursor.execute(f"SELECT id, fields FROM `{table_name}` WHERE id IN ({format_strings})", tuple(batch))
+        for record_id, fields in cursor.fetchall():
+            stored[record_id] = load_json(fields)
+    return stored
+
+
+def change_entry(record_id, fields, previous_fields=None, deleted=False):
+    """Describe a changed record by id, slug and linked records (old and new)."""
+    entry = {"id": record_id, "slug": fields.get("slug")}
+    if previous_fields and previous_fields.get("slug") != entry["slug"]:
+        # Renamed: the cache keys of the old slug must go too
+        entry["previous_slug"] = previous_fields.get("slug")
+    for link_field in CHANGE_LINK_FIELDS:
+        links = set(fields.get(link_field) or [])
+        if previous_fields:
+            links |= set(previous_fields.get(link_field) or [])
+        if links:
+            entry[link_field] = sorted(links)
+    if deleted:
+        entry["deleted"] = True
+    return entry
+
+
+def list_record_ids(table, table_name):
+    """Ids of every record of an Airtable table, fetching one small field if possible."""
+    probe_field = ID_PROBE_FIELDS.get(table_name)
+    if probe_field:
+        try:
+            return [r["id"] for r in table.all(fields=[probe_field])]
+        except requests.HTTPError as e:
+            # Unknown field (renamed in Airtable): fall back to full records
+            print(f"Warning: id probe on {table_name}.{probe_field} failed ({e}), fetching full records")
+    return [r["id"] for r in table.all()]
+
+
+def sync_table(table_name, api, cursor, downloads, since=None, target=None):
+    """
+    Sync a single table from Airtable to MySQL.
+    With `since`, only records modified after it are fetched and upserted.
+    Rows are written to `target` (a shadow table) when given.
+    Returns the ids of every record still in Airtable (for cleanup) and the
+    list of records whose content changed or that were deleted.
+    """
+    target = target or table_name
+    
     print(f"\n{'='*50}")
     print(f"Syncing table: {table_name}")
     print(f"{'='*50}")
     
     # Ensure table exists
-    create_table_if_not_exists(cursor, table_name)
+    create_table_if_not_exists(cursor, target)
     
     # Get table from Airtable
     table = api.table(AIRTABLE_BASE_ID, table_name)
-    records = table.all()
+    if since:
+        print(f"Incremental sync: records modified since {since.isoformat()}")
+        records = table.all(formula=modified_since_formula(since))
+    else:
+        records = table.all()
     
     print(f"Found {len(records)} records")
     
+    processed_records = []
     for record in records:
         record_id = record["id"]
-        created_time = record["createdTime"]
-        fields = record["fields"]
         
         print(f"\nProcessing record: {record_id}")
         
-        # Process attachments in fields
-        processed_fields = process_attachments_in_fields(fields, table_name, record_id)
-        
-        # Convert to JSON for storage
-        fields_json = json.dumps(processed_fields, ensure_ascii=False)
-        
-        # Upsert into MySQL
-        upsert_query = f"""
-            INSERT INTO `{table_name}` (id, createdTime, fields)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE
-                createdTime = VALUES(createdTime),
-                fields = VALUES(fields)
-        """
-        
-        cursor.execute(upsert_query, (record_id, created_time, fields_json))
+        # Process attachments in fields (downloads are queued)
+        processed_fields = process_attachments_in_fields(record["fields"], table_name, record_id, downloads)
+        processed_records.append((record_id, record["createdTime"], processed_fields))
+    
+    # Download everything for this table concurrently; URLs switch to local on success
+    downloads.run()
+    
+    # Compare with the stored rows to report what actually changed
+    cursor.execute(f"SELECT id FROM `{target}`")
+    stored_ids = {row[0] for row in cursor.fetchall()}
+    previous = fetch_stored_fields(cursor, target, [r[0] for r in processed_records])
+    changes = [
+        change_entry(record_id, processed_fields, previous.get(record_id))
+        for record_id, _, processed_fields in processed_records
+        if previous.get(record_id) != processed_fields
+    ]
+    
+    # Convert to JSON for storage
+    rows = [
+        (record_id, created_time, json.dumps(processed_fields, ensure_ascii=False))
+        for record_id, created_time, processed_fields in processed_records
+    ]
+    
+    # Upsert into MySQL, one multi-row INSERT per batch
+    upsert_query = f"""
+        INSERT INTO `{target}` (id, createdTime, fields)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            createdTime = VALUES(createdTime),
+            fields = VALUES(fields)
+    """
+    for batch in chunks(rows):
+        cursor.executemany(upsert_query, batch)
     
     print(f"\nCompleted syncing {table_name}: {len(records)} records")
     
-    # Return list of synced IDs for cleanup
-    return [r["id"] for r in records]
+    # List of synced IDs for cleanup
+    if since:
+        # Only the ids are needed to detect deletions
+        active_ids = list_record_ids(table, table_name)
+    else:
+        active_ids = [r["id"] for r in records]
+    
+    deleted = fetch_stored_fields(cursor, target, stored_ids - set(active_ids))
+    changes += [
+        change_entry(record_id, fields, deleted=True)
+        for record_id, fields in deleted.items()
+    ]
+    print(f"Changed records in {table_name}: {len(changes)}")
+    
+    return active_ids, changes
 
 
 def cleanup_records(cursor, table_name, active_ids):
@@ -228,15 +717,27 @@ def cleanup_records(cursor, table_name, active_ids):
         cursor.execute(f"DELETE FROM `{table_name}`")
         return
 
-    # Delete records that are NOT in active_ids
-    format_strings = ','.join(['%s'] * len(active_ids))
-    query = f"DELETE FROM `{table_name}` WHERE id NOT IN ({format_strings})"
-    cursor.execute(query, tuple(active_ids))
+    # Stage the active ids in a temporary table, then anti-join
+    cursor.execute("CREATE TEMPORARY TABLE IF NOT EXISTS `_sync_active_ids` (id VARCHAR(255) PRIMARY KEY)")
+    cursor.execute("DELETE FROM `_sync_active_ids`")
+    for batch in chunks([(record_id,) for record_id in active_ids]):
+        cursor.executemany("INSERT INTO `_sync_active_ids` (id) VALUES (%s)", batch)
+
+    cursor.execute(f"""
+        DELETE t FROM `{table_name}` t
+        LEFT JOIN `_sync_active_ids` a ON a.id = t.id
+        WHERE a.id IS NULL
+    """)
     deleted_count = cursor.rowcount
     if deleted_count > 0:
         print(f"  Cleaning up: deleted {deleted_count} stale records from {table_name}")
 
 
+# Folders written directly under a record folder before images were
+# stored per attachment
+LEGACY_IMAGE_DIRS = {"thumbnails", "variants"}
+
+
 def cleanup_images(table_name, active_ids):
     """Delete local image folders for records that are no longer in Airtable."""
     table_dir = os.path.join(IMAGE_STORE_PATH, table_name)
@@ -245,14 +746,298 @@ def cleanup_images(table_name, active_ids):
 
     # Iterate over directories in table_dir
     for record_id in os.listdir(table_dir):
+        record_dir = os.path.join(table_dir, record_id)
+        if not os.path.isdir(record_dir):
+            continue
         if record_id not in active_ids:
-            record_dir = os.path.join(table_dir, record_id)
-            if os.path.isdir(record_dir):
-                print(f"  Cleaning up: deleting images for stale record {record_id}")
-                shutil.rmtree(record_dir)
+            print(f"  Cleaning up: deleting images for stale record {record_id}")
+            shutil.rmtree(record_dir)
+            continue
+        # Files of the previous layout (not in a per-attachment folder)
+        for name in os.listdir(record_dir):
+            path = os.path.join(record_dir, name)
+            if name in LEGACY_IMAGE_DIRS:
+                shutil.rmtree(path)
+            elif os.path.isfile(path):
+                os.remove(path)
+
+
+def print_download_summary(downloads):
+    """Print how many files were downloaded and which ones failed."""
+    print(
+        f"\nDownloads: {downloads.downloaded} ok, {downloads.skipped} unchanged, "
+        f"{len(downloads.failed)} failed"
+    )
+    for url, save_path in downloads.failed:
+        print(f"  Failed: {save_path} ({url})")
+
+
+def prepare_shadow_table(cursor, table_name):
+    """Create `<table>__shadow` with the live schema, seeded with the live rows."""
+    shadow = f"{table_name}{SHADOW_SUFFIX}"
+    create_table_if_not_exists(cursor, table_name)
+    cursor.execute(f"DROP TABLE IF EXISTS `{shadow}`")
+    cursor.execute(f"CREATE TABLE `{shadow}` LIKE `{table_name}`")
+    # Unchanged rows are carried over, so incremental syncs still work
+    cursor.execute(f"""
+        INSERT INTO `{shadow}` (id, createdTime, fields, updated_at)
+        SELECT id, createdTime, fields, updated_at FROM `{table_name}`
+    """)
+    return shadow
+
+
+def swap_shadow_tables(cursor, table_names):
+    """
+    Publish every shadow table at once with a single RENAME TABLE.
+    The replaced tables are kept as `<table>__prev` for rollback.
+    """
+    for table_name in table_names:
+        cursor.execute(f"DROP TABLE IF EXISTS `{table_name}{PREVIOUS_SUFFIX}`")
+    
+    renames = []
+    for table_name in table_names:
+        renames.append(f"`{table_name}` TO `{table_name}{PREVIOUS_SUFFIX}`")
+        renames.append(f"`{table_name}{SHADOW_SUFFIX}` TO `{table_name}`")
+    cursor.execute("RENAME TABLE " + ", ".join(renames))
+    print(f"\nSwapped in new generation of: {', '.join(table_names)}")
+
+
+def existing_tables(cursor, table_names):
+    """The tables of `table_names` present in the current database."""
+    if not table_names:
+        return set()
+    placeholders = ", ".join(["%s"] * len(table_names))
+    cursor.execute(
+        "SELECT TABLE_NAME FROM information_schema.TABLES "
+        f"WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({placeholders})",
+        list(table_names)
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def rollback_tables(connection, table_names=TABLES):
+    """
+    Swap the previous generation (`<table>__prev`) back in, atomically.
+    Tables without a previous generation (never swapped) are left as they are.
+    """
+    cursor = connection.cursor()
+    try:
+        previous = existing_tables(cursor, [f"{t}{PREVIOUS_SUFFIX}" for t in table_names])
+        skipped = [t for t in table_names if f"{t}{PREVIOUS_SUFFIX}" not in previous]
+        if skipped:
+            print(f"No previous generation of: {', '.join(skipped)}")
+        table_names = [t for t in table_names if t not in skipped]
+        if not table_names:
+            print("Nothing to roll back")
+            return
+        
+        renames = []
+        for table_name in table_names:
+            renames.append(f"`{table_name}` TO `{table_name}{SHADOW_SUFFIX}`")
+            renames.append(f"`{table_name}{PREVIOUS_SUFFIX}` TO `{table_name}`")
+            renames.append(f"`{table_name}{SHADOW_SUFFIX}` TO `{table_name}{PREVIOUS_SUFFIX}`")
+        cursor.execute("RENAME TABLE " + ", ".join(renames))
+        print(f"Rolled back to previous generation of: {', '.join(table_names)}")
+        
+        # The high-water marks describe the newer generation: force a full sync next time
+        create_sync_state_table(cursor)
+        cursor.executemany("DELETE FROM `sync_state` WHERE table_name = %s", [(t,) for t in table_names])
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def search_text(value):
+    """Searchable text of a field value (lists are joined)."""
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return " ".join(search_text(v) for v in value if not isinstance(v, dict))
+    return str(value)
+
+
+def build_search_index(db, rows_by_table):
+    """
+    Fill the full-text search table of the replica: one row per online
+    record of SEARCH_TABLES, with the URL of the page showing it.
+    """
+    fields_by_table = {
+        table_name: {row["id"]: json.loads(row["fields"]) for row in rows}
+        for table_name, rows in rows_by_table.items()
+    }
+    
+    def is_online(fields):
+        # Drafts and records without a status are not published
+        return fields.get("status") == "Online"
+    
+    # Slugs of the online records of each table (page URLs)
+    slugs_by_table = {
+        table_name: {
+            record_id: fields.get("slug")
+            for record_id, fields in records.items()
+            if is_online(fields) and fields.get("slug")
+        }
+        for table_name, records in fields_by_table.items()
+    }
+    
+    entries = []
+    for table_name, source in SEARCH_TABLES.items():
+        for record_id, fields in fields_by_table.get(table_name, {}).items():
+            if not is_online(fields):
+                continue
+            if source.parent_table:
+                # Shown on the page of its (first) online parent
+                parent_slugs = slugs_by_table.get(source.parent_table, {})
+                slugs = [parent_slugs.get(p) for p in fields.get(source.link_field) or []]
+                slug = next((s for s in slugs if s), None)
+            else:
+                slug = fields.get("slug")
+            if not slug:
+                continue
+            url = f"{source.url_prefix}/{slug}"
+            if source.anchor:
+                url += "#" + source.anchor.format(id=record_id)
+            entries.append({
+                "id": f"{table_name}:{record_id}",
+                "kind": source.kind,
+                "url": url,
+                **{column: search_text(fields.get(column)) for column in SEARCH_COLUMNS},
+            })
+    
+    table = db[replica.SEARCH_TABLE]
+    table.create({"id": str, "kind": str, "url": str, **{c: str for c in SEARCH_COLUMNS}}, pk="id")
+    table.insert_all(entries, batch_size=SYNC_BATCH_SIZE)
+    table.enable_fts(SEARCH_COLUMNS, fts_version="FTS5", tokenize="porter unicode61 remove_diacritics 2")
+    print(f"  Replica: search index ({len(entries)} entries)")
+
+
+def publish_replica(connection, table_names=TABLES, path=replica.REPLICA_PATH):
+    """
+    Write the live tables to a new SQLite file, then rename it over the
+    replica read by the site, so readers never see a half-written file.
+    """
+    tmp_path = f"{path}.tmp"
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    
+    cursor = connection.cursor()
+    try:
+        db = sqlite_utils.Database(tmp_path)
+        rows_by_table = {}
+        for table_name in table_names:
+            cursor.execute(f"SELECT id, createdTime, fields, slug, sort_order FROM `{table_name}`")
+            rows = [
+                {
+                    "id": record_id,
+                    "createdTime": str(created_time) if created_time else None,
+                    "fields": fields.decode() if isinstance(fields, (bytes, bytearray)) else fields,
+                    "slug": slug,
+                    "sort_order": float(sort_order) if sort_order is not None else None,
+                }
+                for record_id, created_time, fields, slug, sort_order in cursor.fetchall()
+            ]
+            db[table_name].create({
+                "id": str, "createdTime": str, "fields": str, "slug": str, "sort_order": float
+            }, pk="id")
+            db[table_name].insert_all(rows, batch_size=SYNC_BATCH_SIZE)
+            db[table_name].create_index(["slug"])
+            db[table_name].create_index(["sort_order"])
+            
+            if table_name == "configs":
+                links = [
+                    {"config_id": row["id"], "vehicle_id": vehicle_id}
+                    for row in rows
+                    for vehicle_id in json.loads(row["fields"]).get("vehicle", [])
+                ]
+                db[replica.CONFIG_LINKS_TABLE].create(
+                    {"config_id": str, "vehicle_id": str}, pk=("vehicle_id", "config_id")
+                )
+                db[replica.CONFIG_LINKS_TABLE].insert_all(links)
+            rows_by_table[table_name] = rows
+            print(f"  Replica: {table_name} ({len(rows)} rows)")
+        
+        build_search_index(db, rows_by_table)
+        db.analyze()
+        db.vacuum()
+        db.close()
+    finally:
+        cursor.close()
+    
+    os.replace(tmp_path, path)
+    print(f"Published SQLite replica: {path}")
+
+
+def publish_replica_safely(connection):
+    """Publish the replica; a failure leaves the previous one in place."""
+    try:
+        publish_replica(connection)
+    except Exception as e:
+        print(f"Warning: SQLite replica not published: {e}")
+
+
+def run_sync(connection, api, downloads, full=False, swap=False):
+    """
+    Sync every table, then drop stale records and images.
+    Returns {table_name: [changed records]} for cache invalidation.
+    Without `swap`, live tables are updated in one transaction. With `swap`,
+    each table is built as a shadow table and all of them are published
+    together by swap_shadow_tables, so readers never see a half-synced catalog.
+    """
+    cursor = connection.cursor()
+    
+    try:
+        create_sync_state_table(cursor)
+        
+        active_ids_by_table = {}
+        changes_by_table = {}
+        high_waters = {}
+        for table_name in TABLES:
+            since = None if full else get_high_water(cursor, table_name)
+            high_waters[table_name] = datetime.now(timezone.utc)
+            target = prepare_shadow_table(cursor, table_name) if swap else table_name
+            
+            failed_before = len(downloads.failed)
+            active_ids, changes = sync_table(table_name, api, cursor, downloads, since=since, target=target)
+            if len(downloads.failed) > failed_before:
+                # Keep the old mark: the next sync fetches these records (and their files) again
+                print(f"Downloads failed for {table_name}: high-water mark not advanced")
+                del high_waters[table_name]
+            cleanup_records(cursor, target, active_ids)
+            active_ids_by_table[table_name] = set(active_ids)
+            if changes:
+                changes_by_table[table_name] = changes
+        
+        if swap:
+            connection.commit()
+            swap_shadow_tables(cursor, TABLES)
+        
+        # High-water marks only move once the rows are live
+        for table_name, high_water in high_waters.items():
+            set_high_water(cursor, table_name, high_water)
+        connection.commit()
+        
+        for table_name, active_ids in active_ids_by_table.items():
+            cleanup_images(table_name, active_ids)
+        
+        publish_replica_safely(connection)
+        
+        print_download_summary(downloads)
+        print("\n" + "=" * 60)
+        print("Sync completed successfully!")
+        print("=" * 60)
+        
+        return changes_by_table
+        
+    except Exception as e:
+        connection.rollback()
+        print(f"\nError during sync: {e}")
+        raise
+    finally:
+        cursor.close()
 
 
-def main():
+def main(full=False, swap=False, rollback=False):
     """Main sync function."""
     print("=" * 60)
     print("Starting Airtable to MySQL Sync")
@@ -268,73 +1053,80 @@ def main():
     # Initialize Airtable API
     api = Api(AIRTABLE_SECRET_TOKEN)
     
-    # Connect to MySQL (with optional SSH tunnel)
-    if USE_SSH_TUNNEL:
-        print("Using SSH tunnel...")
-        if not SSH_USER or not SSH_PASSWORD:
-            raise RuntimeError("SSH_USER and SSH_PASSWORD must be set when USE_SSH_TUNNEL is true")
-        
-        with SSHTunnelForwarder(
-            (SSH_HOST, 22),
-            ssh_username=SSH_USER,
-            ssh_password=SSH_PASSWORD,
-            remote_bind_address=(MYSQL_HOST, 3306)
-        ) as tunnel:
-            print(f"SSH tunnel established on local port {tunnel.local_bind_port}")
+    # Shared HTTP session and download queue for all attachments
+    manifest = DownloadManifest()
+    downloads = DownloadQueue(create_http_session(), manifest=manifest)
+    
+    def work(connection):
+        if rollback:
+            rollback_tables(connection)
+            publish_replica_safely(connection)
+            return None
+        return run_sync(connection, api, downloads, full=full, swap=swap)
+    
+    try:
+        # Connect to MySQL (with optional SSH tunnel)
+        if USE_SSH_TUNNEL:
+            print("Using SSH tunnel...")
+            if not SSH_USER or not SSH_PASSWORD:
+                raise RuntimeError("SSH_USER and SSH_PASSWORD must be set when USE_SSH_TUNNEL is true")
             
+            with SSHTunnelForwarder(
+                (SSH_HOST, 22),
+                ssh_username=SSH_USER,
+                ssh_password=SSH_PASSWORD,
+                remote_bind_address=(MYSQL_HOST, 3306)
+            ) as tunnel:
+                print(f"SSH tunnel established on local port {tunnel.local_bind_port}")
+                
+                connection = mysql.connector.connect(
+                    host="127.0.0.1",
+                    port=tunnel.local_bind_port,
+                    user=MYSQL_USER,
+                    password=MYSQL_PASSWORD,
+                    database=MYSQL_DATABASE
+                )
+                try:
+                    work(connection)
+                finally:
+                    connection.close()
+        else:
+            # Direct connection (for running on PythonAnywhere)
             connection = mysql.connector.connect(
-                host="127.0.0.1",
-                port=tunnel.local_bind_port,
+                host=MYSQL_HOST,
                 user=MYSQL_USER,
                 password=MYSQL_PASSWORD,
                 database=MYSQL_DATABASE
             )
-            cursor = connection.cursor()
-            
             try:
-                for table_name in TABLES:
-                    sync_table(table_name, api, cursor)
-                
-                connection.commit()
-                print("\n" + "=" * 60)
-                print("Sync completed successfully!")
-                print("=" * 60)
-                
-            except Exception as e:
-                connection.rollback()
-                print(f"\nError during sync: {e}")
-                raise
+                changes = work(connection)
             finally:
-                cursor.close()
                 connection.close()
-    else:
-        # Direct connection (for running on PythonAnywhere)
-        connection = mysql.connector.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DATABASE
-        )
-        cursor = connection.cursor()
-        
-        try:
-            for table_name in TABLES:
-                sync_table(table_name, api, cursor)
-            
-            connection.commit()
-            print("\n" + "=" * 60)
-            print("Sync completed successfully!")
-            print("=" * 60)
             
-        except Exception as e:
-            connection.rollback()
-            print(f"\nError during sync: {e}")
-            raise
-        finally:
-            cursor.close()
-            connection.close()
-            clear_cache()
+            # Targeted invalidation after a sync, full clear after a rollback
+            if changes is None:
+                clear_cache()
+            elif changes:
+                invalidate_records(changes)
+            else:
+                print("No changes: cache left untouched")
+    finally:
+        manifest.save()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Sync Airtable tables to MySQL")
+    parser.add_argument(
+        "--full", action="store_true",
+        help="ignore the high-water marks and re-sync every record"
+    )
+    parser.add_argument(
+        "--swap", action="store_true",
+        help="build shadow tables and publish them atomically with RENAME TABLE"
+    )
+    parser.add_argument(
+        "--rollback", action="store_true",
+        help="swap the previous generation of the tables back in, then exit"
+    )
+    args = parser.parse_args()
+    main(full=args.full, swap=args.swap, rollback=args.rollback)
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Read at import time by utils.airtable, utils.replica and utils.caching
+_tmp = tempfile.mkdtemp(prefix="bellevitesse-tests-")
+os.environ.setdefault("AIRTABLE_SECRET_TOKEN", "test-token")
+os.environ.setdefault("AIRTABLE_BASE_ID", "appTest")
+os.environ.setdefault("STATIC_FOLDER", os.path.join(ROOT, "static"))
+os.environ.setdefault("STATIC_URL_PATH", "/static")
+os.environ["CATALOG_REPLICA_PATH"] = os.path.join(_tmp, "catalog.sqlite3")
+os.environ["CACHE_GENERATION_FILE"] = os.path.join(_tmp, "cache-generation")
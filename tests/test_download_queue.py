@@ -0,0 +1,113 @@
+"""DownloadQueue against a local HTTP server standing in for Airtable's CDN."""
+
+import functools
+import http.server
+import threading
+from collections import Counter
+
+import pytest
+import requests
+
+import sync_airtable
+from sync_airtable import DownloadManifest, DownloadQueue, process_attachment
+
+
+@pytest.fixture
+def server(tmp_path):
+    """Serve tmp_path/www over HTTP; yields (base_url, files dir, request counter)."""
+    root = tmp_path / "www"
+    root.mkdir()
+    hits = Counter()
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        def do_GET(self):
+            hits[self.path] += 1
+            super().do_GET()
+
+        def log_message(self, *args):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(Handler, directory=str(root))
+    )
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_address[1]}", root, hits
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    path = tmp_path / "images"
+    monkeypatch.setattr(sync_airtable, "IMAGE_STORE_PATH", str(path))
+    return path
+
+
+def test_downloads_and_reports(server, tmp_path):
+    base_url, root, _ = server
+    (root / "a.txt").write_bytes(b"alpha")
+    done = []
+
+    queue = DownloadQueue(requests.Session())
+    queue.add(f"{base_url}/a.txt", str(tmp_path / "out" / "a.txt"), lambda: done.append("a"))
+    queue.add(f"{base_url}/missing.txt", str(tmp_path / "out" / "missing.txt"), lambda: done.append("missing"))
+    queue.run()
+
+    assert (tmp_path / "out" / "a.txt").read_bytes() == b"alpha"
+    assert done == ["a"]
+    assert queue.downloaded == 1
+    assert [path for _, path in queue.failed] == [str(tmp_path / "out" / "missing.txt")]
+    assert not list((tmp_path / "out").glob("*.part"))
+
+
+def test_same_filename_in_one_record_does_not_collide(server, store):
+    base_url, root, _ = server
+    (root / "one").write_bytes(b"first")
+    (root / "two").write_bytes(b"second")
+    attachments = [
+        {"id": "att1", "url": f"{base_url}/one", "filename": "photo.jpg"},
+        {"id": "att2", "url": f"{base_url}/two", "filename": "photo.jpg"},
+    ]
+
+    queue = DownloadQueue(requests.Session())
+    processed = [process_attachment(a, "vehicles", "rec1", queue) for a in attachments]
+    queue.run()
+
+    assert not queue.failed
+    assert (store / "vehicles" / "rec1" / "att1" / "photo.jpg").read_bytes() == b"first"
+    assert (store / "vehicles" / "rec1" / "att2" / "photo.jpg").read_bytes() == b"second"
+    assert processed[0]["url"] != processed[1]["url"]
+
+
+def test_jobs_for_the_same_file_download_once(server, tmp_path):
+    base_url, root, hits = server
+    (root / "a.txt").write_bytes(b"alpha")
+    save_path = str(tmp_path / "out" / "a.txt")
+    done = []
+
+    queue = DownloadQueue(requests.Session())
+    for name in ("first", "second"):
+        queue.add(f"{base_url}/a.txt", save_path, functools.partial(done.append, name))
+    queue.run()
+
+    assert hits["/a.txt"] == 1
+    assert sorted(done) == ["first", "second"]
+    assert not queue.failed
+
+
+def test_manifest_skips_unchanged_files(server, tmp_path):
+    base_url, root, hits = server
+    (root / "a.txt").write_bytes(b"alpha")
+    save_path = str(tmp_path / "out" / "a.txt")
+    manifest = DownloadManifest(str(tmp_path / "manifest.json"))
+
+    for _ in range(2):
+        queue = DownloadQueue(requests.Session(), manifest)
+        queue.add(f"{base_url}/a.txt", save_path, key="att1/main", fingerprint="a.txt:5")
+        queue.run()
+
+    assert hits["/a.txt"] == 1
+    assert queue.skipped == 1
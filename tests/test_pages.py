@@ -0,0 +1,121 @@
+"""Pages rendered from the SQLite replica published by the sync."""
+
+import json
+import os
+
+import pytest
+import sqlite_utils
+
+from utils import airtable, caching, replica
+
+VEHICLE = {
+    "id": "recVehicle",
+    "createdTime": "2024-01-01T00:00:00.000Z",
+    "fields": {
+        "name": "eTrike",
+        "slug": "etrike",
+        "status": "Online",
+        "order": 1,
+        "max_speed": 25,
+        "banner": [{
+            "id": "attBanner",
+            "url": "/static/images/airtable/vehicles/recVehicle/attBanner/banner.jpg",
+            "filename": "banner.jpg",
+            "variants": {
+                "width": 2000,
+                "height": 1000,
+                "sources": {
+                    "webp": [
+                        {"url": "/static/images/airtable/vehicles/recVehicle/attBanner/variants/banner-480.webp",
+                         "width": 480, "height": 240},
+                        {"url": "/static/images/airtable/vehicles/recVehicle/attBanner/variants/banner-960.webp",
+                         "width": 960, "height": 480},
+                    ],
+                },
+            },
+        }],
+    },
+}
+
+
+class OfflineTable:
+    """Airtable table that must not be read while the replica is published."""
+
+    def __init__(self, records=()):
+        self.records = list(records)
+        self.calls = 0
+
+    def all(self, **kwargs):
+        self.calls += 1
+        return self.records
+
+    def first(self, **kwargs):
+        self.calls += 1
+        return self.records[0] if self.records else None
+
+
+def publish(tables):
+    """Write a replica shaped like sync_airtable.publish_replica's."""
+    path = replica.REPLICA_PATH
+    if os.path.exists(path):
+        os.remove(path)
+    db = sqlite_utils.Database(path)
+    for table_name in replica.RECORD_TYPES:
+        db[table_name].create({
+            "id": str, "createdTime": str, "fields": str, "slug": str, "sort_order": float
+        }, pk="id")
+        db[table_name].insert_all(
+            {
+                "id": r["id"],
+                "createdTime": r["createdTime"],
+                "fields": json.dumps(r["fields"]),
+                "slug": r["fields"].get("slug"),
+                "sort_order": r["fields"].get("order"),
+            }
+            for r in tables.get(table_name, [])
+        )
+    db[replica.CONFIG_LINKS_TABLE].create({"config_id": str, "vehicle_id": str})
+    db.close()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    publish({"vehicles": [VEHICLE]})
+    tables = {
+        name: OfflineTable()
+        for name in ("TABLE_VEHICLES", "TABLE_HEADS", "TABLE_GRIPS_CATEGORIES",
+                     "TABLE_GRIP_PRODUCTS", "TABLE_CONFIGS")
+    }
+    tables["TABLE_STATIC"] = OfflineTable([{"id": "recStatic", "fields": {"language": "en"}}])
+    for name, table in tables.items():
+        monkeypatch.setattr(airtable, name, table)
+
+    from app import app, cache
+    with app.app_context():
+        cache.clear()
+    caching.bump_generation()
+    with app.test_client() as client:
+        yield client, tables
+
+
+def test_vehicle_page_reads_the_replica(client):
+    client, tables = client
+    response = client.get("/vehicles/etrike")
+
+    assert response.status_code == 200
+    assert b"eTrike" in response.data
+    assert client.get("/vehicles/unknown").status_code == 404
+    assert tables["TABLE_VEHICLES"].calls == 0
+    assert tables["TABLE_CONFIGS"].calls == 0
+
+
+def test_vehicle_page_renders_synced_variants(client):
+    client, _ = client
+    html = client.get("/vehicles/etrike").get_data(as_text=True)
+
+    assert '<source type="image/webp"' in html
+    assert (
+        'srcset="/static/images/airtable/vehicles/recVehicle/attBanner/variants/banner-480.webp 480w, '
+        '/static/images/airtable/vehicles/recVehicle/attBanner/variants/banner-960.webp 960w"'
+    ) in html
+    assert 'src="/static/images/airtable/vehicles/recVehicle/attBanner/banner.jpg"' in html
@@ -1,10 +1,22 @@
 from flask_caching import Cache
 from pyairtable import Table
+import logging
 import os
+import threading
+from collections import namedtuple
+from functools import partial
 from dotenv import load_dotenv
 
+from utils import caching, replica
+from utils.records import (
+    Config, GripCategory, GripProduct, Head, Vehicle, convert_record, convert_records,
+)
+from utils.specs import attach_specs, attach_specs_all
+
 load_dotenv("/home/Maxcongi/bellevitesse/.env")    
 
+logger = logging.getLogger(__name__)
+
 cache: Cache = None
 
 # ⚡ Récupérer les variables
@@ -33,11 +45,23 @@ def init_cache(app_cache: Cache):
 
 
 def get_cached(key, fetcher, timeout=3600):
-    value = cache.get(key)
-    if value is None:
-        value = fetcher()
-        cache.set(key, value, timeout=timeout)
-    return value
+    return caching.get_cached(cache, key, fetcher, timeout=timeout)
+
+
+# 🗄️ Lecture : replica SQLite publié par la sync (images locales + variantes),
+# l'API Airtable seulement s'il n'est pas publié (ou illisible)
+def fetch_all(table_name, record_type, table, sort=True):
+    return replica.read_first(
+        lambda: replica.fetch_all(table_name, order_by="order" if sort else None),
+        lambda: convert_records(record_type, table.all(sort=["order"]) if sort else table.all())
+    )
+
+
+def fetch_by_slug(table_name, record_type, table, slug):
+    return replica.read_first(
+        lambda: replica.fetch_by_slug(table_name, slug),
+        lambda: convert_record(record_type, table.first(formula=f"{{slug}}='{slug}'"))
+    )
 
 def get_static_by_lang(lang="en"):
     return get_cached(
@@ -46,50 +70,164 @@ def get_static_by_lang(lang="en"):
     )
 
 def get_vehicles():
-    return get_cached("vehicles", lambda: TABLE_VEHICLES.all(sort=["order"]))
+    return get_cached(
+        "vehicles",
+        lambda: attach_specs_all(fetch_all("vehicles", Vehicle, TABLE_VEHICLES))
+    )
 
 
 def get_heads():
-    return get_cached("heads", lambda: TABLE_HEADS.all(sort=["order"]))
+    return get_cached(
+        "heads",
+        lambda: attach_specs_all(fetch_all("heads", Head, TABLE_HEADS))
+    )
 
 
 def get_grips_categories():
-    return get_cached("grips_categories", lambda: TABLE_GRIPS_CATEGORIES.all(sort=["order"]))
+    return get_cached(
+        "grips_categories",
+        lambda: fetch_all("grips_categories", GripCategory, TABLE_GRIPS_CATEGORIES)
+    )
 
 def get_grips_categories_by_slug(slug):
     return get_cached(
         f"grips_categories_{slug}",
-        lambda: TABLE_GRIPS_CATEGORIES.first(formula=f"{{slug}}='{slug}'")
+        lambda: fetch_by_slug("grips_categories", GripCategory, TABLE_GRIPS_CATEGORIES, slug)
     )
 
-def get_grips_products_for_category(category_id):
+# 🧭 Données communes à toutes les pages (header, footer, textes statiques)
+CatalogContext = namedtuple("CatalogContext", ["vehicles", "heads", "grips_categories", "static"])
+
+
+def get_catalog_context(lang="en"):
+    """Construit le contexte commun, en lecture seule (tuples)."""
+    return CatalogContext(
+        vehicles=tuple(get_vehicles()),
+        heads=tuple(get_heads()),
+        grips_categories=tuple(get_grips_categories()),
+        static=get_static_by_lang(lang),
+    )
+
+
+def group_by_link(records, link_field):
+    """Index records by each parent id found in their linked-record field."""
+    grouped = {}
+    for record in records:
+        for parent_id in record["fields"].get(link_field, []):
+            grouped.setdefault(parent_id, []).append(record)
+    return grouped
+
+def get_grips_products_by_category():
     return get_cached(
-        f"grips_products_{category_id}",
-        lambda: [
-            c for c in TABLE_GRIP_PRODUCTS.all(sort=["order"])
-            if category_id in c["fields"].get("category", [])
-        ]
+        "grips_products_by_category",
+        lambda: group_by_link(
+            fetch_all("grip_products", GripProduct, TABLE_GRIP_PRODUCTS), "category"
+        )
     )
 
+def get_grips_products_for_category(category_id):
+    return get_grips_products_by_category().get(category_id, [])
+
 def get_vehicle_by_slug(slug):
     return get_cached(
         f"vehicle_{slug}",
-        lambda: TABLE_VEHICLES.first(formula=f"{{slug}}='{slug}'")
+        lambda: attach_specs(fetch_by_slug("vehicles", Vehicle, TABLE_VEHICLES, slug))
     )
 
 
 def get_head_by_slug(slug):
     return get_cached(
         f"head_{slug}",
-        lambda: TABLE_HEADS.first(formula=f"{{slug}}='{slug}'")
+        lambda: attach_specs(fetch_by_slug("heads", Head, TABLE_HEADS, slug))
     )
 
 
-def get_configs_for_vehicle(vehicle_id):
+def get_configs_by_vehicle():
     return get_cached(
-        f"configs_vehicle_{vehicle_id}",
-        lambda: [
-            c for c in TABLE_CONFIGS.all()
-            if vehicle_id in c["fields"].get("vehicle", [])
-        ]
+        "configs_by_vehicle",
+        lambda: group_by_link(fetch_all("configs", Config, TABLE_CONFIGS, sort=False), "vehicle")
     )
+
+
+def get_configs_for_vehicle(vehicle_id):
+    return get_configs_by_vehicle().get(vehicle_id, [])
+
+
+# ⚡ Invalidation ciblée : seulement les clés touchées par les records modifiés
+INVALIDATION_TABLES = {"vehicles", "heads", "configs", "grips_categories", "grip_products"}
+
+# Tables synchronisées mais lues par aucune page (grips : ancienne table des grips)
+IGNORED_TABLES = {"grips"}
+
+# La table static n'est pas synchronisée : ses clés sont oubliées à chaque sync
+STATIC_LANGUAGES = ["en"]
+
+# Retourné quand toute la génération du cache a été invalidée
+ALL_KEYS = ["*"]
+
+
+def record_slugs(records):
+    """Slugs actuels et anciens (renommés) des records modifiés."""
+    return sorted({
+        slug
+        for r in records
+        for slug in (r.get("slug"), r.get("previous_slug"))
+        if slug
+    })
+
+
+def live_slugs(records):
+    return sorted({r["slug"] for r in records if r.get("slug") and not r.get("deleted")})
+
+
+def warm_in_background(tasks):
+    """Recharge les clés après la réponse (une grosse sync dépasserait le timeout)."""
+    def warm():
+        for key, fetch in tasks:
+            try:
+                fetch()
+            except Exception as e:
+                logger.error(f"❌ Recharge de {key} échouée : {e}")
+
+    threading.Thread(target=warm, name="cache-rewarm", daemon=True).start()
+
+
+def invalidate_records(changes):
+    """
+    changes : {table: [{"id": ..., "slug": ..., "previous_slug": ..., "deleted": bool}, ...]}
+    Supprime les clés concernées et les recharge en arrière-plan.
+    Les textes static sont toujours rechargés, les tables ignorées (grips) ne
+    touchent rien, une autre table inconnue invalide toute la génération.
+    Retourne la liste des clés invalidées (ALL_KEYS pour toute la génération).
+    """
+    changes = {t: records for t, records in changes.items() if t not in IGNORED_TABLES}
+    if any(table_name not in INVALIDATION_TABLES for table_name in changes):
+        caching.bump_generation()
+        return ALL_KEYS
+
+    keys = [f"static_{lang}" for lang in STATIC_LANGUAGES]
+    tasks = [(f"static_{lang}", partial(get_static_by_lang, lang)) for lang in STATIC_LANGUAGES]
+    for table_name, records in changes.items():
+        slugs, live = record_slugs(records), live_slugs(records)
+        if table_name == "vehicles":
+            keys += ["vehicles"] + [f"vehicle_{slug}" for slug in slugs]
+            tasks.append(("vehicles", get_vehicles))
+            tasks += [(f"vehicle_{slug}", partial(get_vehicle_by_slug, slug)) for slug in live]
+        elif table_name == "heads":
+            keys += ["heads"] + [f"head_{slug}" for slug in slugs]
+            tasks.append(("heads", get_heads))
+            tasks += [(f"head_{slug}", partial(get_head_by_slug, slug)) for slug in live]
+        elif table_name == "configs":
+            keys.append("configs_by_vehicle")
+            tasks.append(("configs_by_vehicle", get_configs_by_vehicle))
+        elif table_name == "grips_categories":
+            keys += ["grips_categories"] + [f"grips_categories_{slug}" for slug in slugs]
+            tasks.append(("grips_categories", get_grips_categories))
+            tasks += [(f"grips_categories_{slug}", partial(get_grips_categories_by_slug, slug)) for slug in live]
+        elif table_name == "grip_products":
+            keys.append("grips_products_by_category")
+            tasks.append(("grips_products_by_category", get_grips_products_by_category))
+
+    caching.forget(cache, keys)
+    warm_in_background(tasks)
+    return keys
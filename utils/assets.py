@@ -0,0 +1,107 @@
+"""
+Fingerprinted static assets.
+build_assets.py writes content-hashed copies of the CSS and JS under
+static/dist, plus a manifest mapping each logical name to its hashed file.
+init_assets makes url_for('static', ...) return the hashed URLs and serves
+them with a year-long immutable Cache-Control.
+write_file / write_compressed (atomic writes, .gz/.br siblings) are shared
+by build_assets.py and export_static.py.
+"""
+
+import gzip
+import json
+import logging
+import os
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+
+# Scripts loaded by layout.html, in order; bundled into BUNDLE_JS
+BUNDLE_JS = "js/bundle.js"
+BUNDLE_SOURCES = [
+    "js/src/initialization.js",
+    "js/src/splide.js",
+    "js/src/countup.js",
+    "js/src/configurator.js",
+    "js/src/infinite-scroll.js",
+    "js/src/filtersliders.js",
+]
+
+IMMUTABLE_MAX_AGE = 31536000
+
+# Precompressed siblings (gzip_static / brotli_static); .br needs brotli
+BROTLI_AVAILABLE = brotli is not None
+
+
+def write_file(path, data):
+    """Write through a temporary file so a half-written file is never served."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(path.name + ".part")
+    temp_path.write_bytes(data)
+    temp_path.replace(path)
+
+
+def write_compressed(path, data):
+    """
+    Write the .gz (and .br) siblings of `path`. Returns the number of files.
+    mtime=0: identical content gives identical .gz files between builds.
+    """
+    write_file(path.with_name(path.name + ".gz"), gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is None:
+        return 1
+    write_file(path.with_name(path.name + ".br"), brotli.compress(data, quality=11))
+    return 2
+
+
+def manifest_path(static_folder):
+    return os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+
+
+def load_manifest(static_folder):
+    """{logical name: hashed name}, empty when the assets were not built."""
+    try:
+        with open(manifest_path(static_folder), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def init_assets(app):
+    """Rewrite static URLs to their hashed version and cache those forever."""
+    manifest = load_manifest(app.static_folder) if app.static_folder else {}
+    if manifest:
+        logger.info(f"{len(manifest)} fingerprinted assets loaded")
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        # Source files stay editable in debug
+        if endpoint != "static" or app.debug:
+            return
+        filename = values.get("filename", "").lstrip("/")
+        hashed = manifest.get(filename)
+        if hashed:
+            values["filename"] = hashed
+
+    @app.after_request
+    def cache_fingerprinted(response):
+        dist_prefix = f"{app.static_url_path}/{DIST_DIR}/"
+        if request.path.startswith(dist_prefix) and response.status_code in (200, 304):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+
+    @app.context_processor
+    def inject_assets():
+        # The bundle replaces the individual scripts once built
+        return {"assets_bundled": not app.debug and BUNDLE_JS in manifest}
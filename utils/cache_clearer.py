@@ -2,9 +2,15 @@ import os
 import requests
 from dotenv import load_dotenv
 
-def clear_cache():
+BASE_URLS = [
+    "https://www.bellevitesse.com",
+    "http://127.0.0.1:5000",
+]
+
+
+def _post_to_all(path, json=None, timeout=10):
     """
-    Clear the cache by sending POST requests to all cache endpoints.
+    POST to the given admin endpoint of every site.
     Uses the ADMIN_CACHE_TOKEN environment variable.
     """
     load_dotenv()
@@ -13,20 +19,16 @@ def clear_cache():
     if not admin_token:
         raise ValueError("ADMIN_CACHE_TOKEN is not defined.")
 
-    urls = [
-        "https://www.bellevitesse.com/admin/cache/clear",
-        "http://127.0.0.1:5000/admin/cache/clear",
-    ]
-
     headers = {"X-Admin-Token": admin_token}
 
     success = True
 
-    for url in urls:
+    for base_url in BASE_URLS:
+        url = f"{base_url}{path}"
         try:
-            response = requests.post(url, headers=headers, timeout=10)
+            response = requests.post(url, headers=headers, json=json, timeout=timeout)
             if response.ok:
-                print(f"✅ Cache successfully cleared for {url}")
+                print(f"✅ Cache successfully updated for {url}")
             else:
                 print(f"❌ Error {response.status_code} for {url}: {response.text}")
                 success = False
@@ -37,5 +39,20 @@ def clear_cache():
     return success
 
 
+def clear_cache():
+    """
+    Clear the cache by sending POST requests to all cache endpoints.
+    """
+    return _post_to_all("/admin/cache/clear")
+
+
+def invalidate_records(changes):
+    """
+    Invalidate and re-warm only the cache keys touched by changed records.
+    changes: {table_name: [{"id": ..., "slug": ..., ...}, ...]} as returned by the sync.
+    """
+    return _post_to_all("/admin/cache/invalidate", json={"changes": changes})
+
+
 if __name__ == "__main__":
     clear_cache()
@@ -0,0 +1,246 @@
+"""
+Cache helpers shared by the data modules.
+get_cached adds per-key single-flight and stale-while-revalidate on top of
+a Flask-Caching backend: only one fetcher runs per key, and once a value
+passes its soft expiry it keeps being served while a background thread
+refreshes it.
+
+Every key carries the catalog generation, read from the mtime of a file
+shared by all workers: bumping it invalidates the whole catalog at once,
+and entries of older generations simply expire.
+
+In front of the backend, a per-process tier keeps the values as frozen
+objects (FrozenDict / tuple) shared by reference, so hot reads neither
+unpickle nor copy anything. It holds a value for at most LOCAL_TTL
+seconds and at most LOCAL_MAX_ENTRIES values (least recently used out
+first). forget() touches a second shared file, INVALIDATION_FILE: every
+worker drops its whole local tier when its mtime changes, so a targeted
+invalidation is seen by all workers on their next read.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+logger = logging.getLogger(__name__)
+
+GENERATION_FILE = os.getenv(
+    "CACHE_GENERATION_FILE",
+    os.path.join(tempfile.gettempdir(), "bellevitesse-cache-generation")
+)
+
+# Touched by forget(): every worker's local tier is dropped
+INVALIDATION_FILE = os.getenv("CACHE_INVALIDATION_FILE", GENERATION_FILE + ".invalidated")
+
+LOCAL_TTL = float(os.getenv("CACHE_LOCAL_TTL", "30"))
+# Same bound as the backend by default (CACHE_THRESHOLD)
+LOCAL_MAX_ENTRIES = int(os.getenv("CACHE_LOCAL_MAX_ENTRIES", os.getenv("CACHE_THRESHOLD", "5000")))
+
+# What is actually stored in the backend for every get_cached key
+CacheEntry = namedtuple("CacheEntry", ["value", "fresh_until"])
+
+# In-process tier: {versioned key: (frozen value, expires)}, in LRU order
+_local = OrderedDict()
+_local_guard = threading.Lock()
+_local_version = None
+stats = Counter()
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _file_version(path):
+    """mtime of a shared marker file (one stat call, no file read)."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _bump_file(path):
+    """Move the mtime of a marker file forward, even within one clock tick."""
+    version = max(time.time_ns(), _file_version(path) + 1)
+    with open(path, "a"):
+        pass
+    os.utime(path, ns=(version, version))
+    return version
+
+
+def get_generation():
+    """Current catalog generation."""
+    return _file_version(GENERATION_FILE)
+
+
+def bump_generation():
+    """Start a new catalog generation for every worker sharing the file."""
+    return _bump_file(GENERATION_FILE)
+
+
+def versioned_key(key, generation=None):
+    """Key as stored in the backend, tagged with the (current) generation."""
+    if generation is None:
+        generation = get_generation()
+    return f"{key}@{generation}"
+
+
+class FrozenDict(dict):
+    """Read-only dict: still a dict for templates, json and isinstance checks."""
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("cached catalog objects are read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value):
+    """Deep read-only copy: dicts become FrozenDict, lists become tuples."""
+    if isinstance(value, FrozenDict):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def _local_get(key, generation):
+    global _local_version
+    # New generation, or keys forgotten by any worker: every local entry is suspect
+    version = (generation, _file_version(INVALIDATION_FILE))
+    with _local_guard:
+        if version != _local_version:
+            _local.clear()
+            _local_version = version
+        item = _local.get(key)
+        if item is None:
+            return None
+        if time.time() >= item[1]:
+            # Expired: drop it, the caller reads the backend again
+            del _local[key]
+            return None
+        _local.move_to_end(key)
+        return item
+
+
+def _local_set(key, value, fresh_until):
+    frozen = freeze(value)
+    with _local_guard:
+        _local[key] = (frozen, min(fresh_until, time.time() + LOCAL_TTL))
+        _local.move_to_end(key)
+        while len(_local) > LOCAL_MAX_ENTRIES:
+            _local.popitem(last=False)
+    return frozen
+
+
+def forget(cache, keys):
+    """Delete keys from the backend and from the local tier of every worker."""
+    versioned = [versioned_key(key) for key in keys]
+    if not versioned:
+        return versioned
+    if cache is not None:
+        cache.delete_many(*versioned)
+    with _local_guard:
+        for key in versioned:
+            _local.pop(key, None)
+    # Other workers drop their local tier on their next read
+    _bump_file(INVALIDATION_FILE)
+    return versioned
+
+
+def cache_stats():
+    """
+    Counters of this process (local/backend hits, misses that ran the
+    fetcher, waits on another caller's fetch) and size of its local tier.
+    """
+    return {**stats, "local_entries": len(_local)}
+
+
+def _key_lock(key):
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = threading.Lock()
+        return lock
+
+
+def _forget_lock(key, lock):
+    with _locks_guard:
+        if _locks.get(key) is lock:
+            del _locks[key]
+
+
+def _store(cache, key, fetcher, timeout, stale_timeout):
+    value = fetcher()
+    entry = CacheEntry(value, time.time() + timeout)
+    cache.set(key, entry, timeout=timeout + stale_timeout)
+    return _local_set(key, value, entry.fresh_until)
+
+
+def _refresh_in_background(cache, key, fetcher, timeout, stale_timeout):
+    lock = _key_lock(key)
+    if not lock.acquire(blocking=False):
+        # Someone is already refreshing this key
+        return
+
+    def refresh():
+        try:
+            _store(cache, key, fetcher, timeout, stale_timeout)
+        except Exception as e:
+            logger.error(f"Background refresh failed for {key}: {e}")
+        finally:
+            lock.release()
+            _forget_lock(key, lock)
+
+    threading.Thread(target=refresh, name=f"cache-refresh-{key}", daemon=True).start()
+
+
+def get_cached(cache, key, fetcher, timeout=3600, stale_timeout=None):
+    """
+    Get a value from cache or fetch it.
+    After `timeout` seconds the value is stale: it is still returned for up
+    to `stale_timeout` more seconds (default: timeout) while it is refreshed
+    in the background.
+    """
+    if cache is None:
+        return fetcher()
+    if stale_timeout is None:
+        stale_timeout = timeout
+    generation = get_generation()
+    key = versioned_key(key, generation)
+
+    item = _local_get(key, generation)
+    if item is not None:
+        stats["local_hits"] += 1
+        return item[0]
+
+    entry = cache.get(key)
+    if isinstance(entry, CacheEntry):
+        stats["backend_hits"] += 1
+        if time.time() >= entry.fresh_until:
+            _refresh_in_background(cache, key, fetcher, timeout, stale_timeout)
+            # Stale: do not pin it locally, the refresh will store the new value
+            return freeze(entry.value)
+        return _local_set(key, entry.value, entry.fresh_until)
+
+    # Miss: one fetcher per key, the other callers wait for its result
+    lock = _key_lock(key)
+    try:
+        with lock:
+            entry = cache.get(key)
+            if isinstance(entry, CacheEntry):
+                # Stored by the caller we waited for: not a miss of our own
+                stats["waits"] += 1
+                return _local_set(key, entry.value, entry.fresh_until)
+            stats["misses"] += 1
+            return _store(cache, key, fetcher, timeout, stale_timeout)
+    finally:
+        _forget_lock(key, lock)
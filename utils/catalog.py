@@ -0,0 +1,112 @@
+"""
+In-memory catalog snapshot.
+Loads every table once and indexes records by id and slug, plus the
+vehicle -> configs link, so the public getters answer with dict lookups.
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogSnapshot:
+    """Immutable view of the whole catalog, built in one pass per table."""
+
+    def __init__(self, tables):
+        # tables: {table_name: [records already sorted by order]}
+        self.loaded_at = time.time()
+        self.tables = tables
+        self.by_id = {}
+        self.by_slug = {}
+
+        for table_name, records in tables.items():
+            self.by_id[table_name] = {r["id"]: r for r in records}
+            self.by_slug[table_name] = {
+                r["fields"]["slug"]: r for r in records if r["fields"].get("slug")
+            }
+
+        self.configs_by_vehicle = {}
+        for config in tables.get("configs", []):
+            for vehicle_id in config["fields"].get("vehicle", []):
+                self.configs_by_vehicle.setdefault(vehicle_id, []).append(config)
+
+    def all(self, table_name):
+        return self.tables.get(table_name, [])
+
+    def get(self, table_name, record_id):
+        return self.by_id.get(table_name, {}).get(record_id)
+
+    def get_by_slug(self, table_name, slug):
+        return self.by_slug.get(table_name, {}).get(slug)
+
+    def configs_for_vehicle(self, vehicle_id):
+        return self.configs_by_vehicle.get(vehicle_id, [])
+
+
+class CatalogHolder:
+    """
+    Holds the current snapshot and rebuilds it when it gets older than ttl.
+    A stale snapshot keeps being served while one background thread rebuilds
+    it; the new snapshot replaces the old one with a single assignment, so
+    readers always see a complete catalog.
+    """
+
+    def __init__(self, loader, table_names, ttl=3600):
+        self._loader = loader
+        self._table_names = table_names
+        self._ttl = ttl
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, snapshot):
+        return snapshot is not None and time.time() - snapshot.loaded_at < self._ttl
+
+    def _rebuild_in_background(self):
+        if not self._lock.acquire(blocking=False):
+            # A rebuild is already running
+            return
+
+        def rebuild():
+            try:
+                self._build()
+            except Exception as e:
+                logger.error(f"Catalog rebuild failed: {e}")
+            finally:
+                self._lock.release()
+
+        threading.Thread(target=rebuild, name="catalog-rebuild", daemon=True).start()
+
+    def peek(self):
+        """Return the current snapshot (possibly stale) without loading it."""
+        snapshot = self._snapshot
+        if snapshot is not None and not self._is_fresh(snapshot):
+            self._rebuild_in_background()
+        return snapshot
+
+    def get(self):
+        snapshot = self.peek()
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            # Another thread may have built it while we were waiting
+            snapshot = self._snapshot
+            if snapshot is not None:
+                return snapshot
+            return self._build()
+
+    def reload(self):
+        """Rebuild the snapshot now, regardless of its age."""
+        with self._lock:
+            return self._build()
+
+    def _build(self):
+        tables = {name: self._loader(name) for name in self._table_names}
+        snapshot = CatalogSnapshot(tables)
+        self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self):
+        self._snapshot = None
@@ -4,65 +4,31 @@ Replaces direct Airtable API calls with MySQL queries.
 Maintains the same interface as the original airtable.py.
 """
 
-import os
-import json
-import mysql.connector
+import logging
+import threading
+
 from flask_caching import Cache
-from dotenv import load_dotenv
-from sshtunnel import SSHTunnelForwarder
 
-# Load environment variables
-load_dotenv()
+from utils import caching, db_pool, replica
+from utils.catalog import CatalogHolder
+from utils.records import RECORD_TYPES, decode_record
+from utils.specs import attach_specs, attach_specs_all
 
-# MySQL Configuration
-MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
-MYSQL_USER = os.getenv("MYSQL_USER")
-MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
-MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
+# Tables loaded into the in-memory catalog snapshot
+CATALOG_TABLES = ["vehicles", "heads", "grips", "configs"]
 
-# SSH Configuration (for local development)
-SSH_HOST = os.getenv("SSH_HOST", "ssh.pythonanywhere.com")
-SSH_USER = os.getenv("SSH_USER")
-SSH_PASSWORD = os.getenv("SSH_PASSWORD")
-USE_SSH_TUNNEL = os.getenv("USE_SSH_TUNNEL", "false").lower() == "true"
+# Tables whose records carry precomputed specs
+SPECS_TABLES = ["vehicles", "heads"]
+CATALOG_TTL = 3600
 
-cache: Cache = None
+logger = logging.getLogger(__name__)
 
-# Global tunnel and connection for SSH mode
-_ssh_tunnel = None
-_ssh_connection = None
+cache: Cache = None
 
 
 def get_db_connection():
-    """Create and return a MySQL connection (with optional SSH tunnel)."""
-    global _ssh_tunnel, _ssh_connection
-    
-    if USE_SSH_TUNNEL:
-        # For SSH tunnel mode, reuse connection if available
-        if _ssh_tunnel is None or not _ssh_tunnel.is_active:
-            _ssh_tunnel = SSHTunnelForwarder(
-                (SSH_HOST, 22),
-                ssh_username=SSH_USER,
-                ssh_password=SSH_PASSWORD,
-                remote_bind_address=(MYSQL_HOST, 3306)
-            )
-            _ssh_tunnel.start()
-        
-        return mysql.connector.connect(
-            host="127.0.0.1",
-            port=_ssh_tunnel.local_bind_port,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DATABASE
-        )
-    else:
-        # Direct connection (for PythonAnywhere)
-        return mysql.connector.connect(
-            host=MYSQL_HOST,
-            user=MYSQL_USER,
-            password=MYSQL_PASSWORD,
-            database=MYSQL_DATABASE
-        )
+    """Check a MySQL connection out of the shared pool (close() returns it)."""
+    return db_pool.get_connection()
 
 
 def init_cache(app_cache: Cache):
@@ -72,67 +38,120 @@ def init_cache(app_cache: Cache):
 
 
 def get_cached(key, fetcher, timeout=3600):
-    """Get a value from cache or fetch it."""
-    if cache is None:
-        return fetcher()
-    value = cache.get(key)
-    if value is None:
-        value = fetcher()
-        cache.set(key, value, timeout=timeout)
-    return value
+    """Get a value from cache or fetch it (single-flight, stale-while-revalidate)."""
+    return caching.get_cached(cache, key, fetcher, timeout=timeout)
 
 
-def _fetch_all_from_table(table_name, order_by=None):
-    """Fetch all records from a table and format like Airtable response."""
+# Generated columns maintained by sync_airtable.ensure_indexes
+INDEXED_FIELDS = {"slug": "slug"}
+ORDER_COLUMNS = {"order": "sort_order"}
+
+
+def _row_to_record(row, record_type):
+    """Decode a MySQL row into the table's record struct (same shape as Airtable)."""
+    return decode_record(
+        record_type,
+        row["id"],
+        str(row["createdTime"]) if row["createdTime"] else None,
+        row["fields"]
+    )
+
+
+def _fetch_records(table_name, query, params=()):
+    """Run a SELECT returning id, createdTime, fields and decode the rows."""
+    record_type = RECORD_TYPES[table_name]
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
     
     try:
-        query = f"SELECT id, createdTime, fields FROM `{table_name}`"
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        
-        records = []
-        for row in rows:
-            fields = json.loads(row["fields"]) if isinstance(row["fields"], str) else row["fields"]
-            records.append({
-                "id": row["id"],
-                "createdTime": str(row["createdTime"]) if row["createdTime"] else None,
-                "fields": fields
-            })
-        
-        # Sort by order field if specified
-        if order_by:
-            records.sort(key=lambda r: r["fields"].get(order_by, 999))
-        
-        return records
+        cursor.execute(query, params)
+        return [_row_to_record(row, record_type) for row in cursor.fetchall()]
     finally:
         cursor.close()
         connection.close()
 
 
+def _fetch_all_from_table(table_name, order_by=None):
+    """Fetch all records from a table and format like Airtable response."""
+    query = f"SELECT id, createdTime, fields FROM `{table_name}`"
+    order_column = ORDER_COLUMNS.get(order_by)
+    if order_column:
+        query += f" ORDER BY `{order_column}`"
+    
+    records = _fetch_records(table_name, query)
+    
+    # Fields without a generated column are sorted in Python
+    if order_by and not order_column:
+        records.sort(key=lambda r: r["fields"].get(order_by, 999))
+    
+    return records
+
+
 def _fetch_by_field(table_name, field_name, field_value):
     """Fetch a single record by field value."""
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+    column = INDEXED_FIELDS.get(field_name)
+    if column:
+        records = _fetch_records(
+            table_name,
+            f"SELECT id, createdTime, fields FROM `{table_name}` WHERE `{column}` = %s LIMIT 1",
+            (field_value,)
+        )
+        return records[0] if records else None
     
-    try:
-        query = f"SELECT id, createdTime, fields FROM `{table_name}`"
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        
-        for row in rows:
-            fields = json.loads(row["fields"]) if isinstance(row["fields"], str) else row["fields"]
-            if fields.get(field_name) == field_value:
-                return {
-                    "id": row["id"],
-                    "createdTime": str(row["createdTime"]) if row["createdTime"] else None,
-                    "fields": fields
-                }
-        return None
-    finally:
-        cursor.close()
-        connection.close()
+    # No index for this field: scan the table
+    for record in _fetch_all_from_table(table_name):
+        if record["fields"].get(field_name) == field_value:
+            return record
+    return None
+
+
+def _fetch_configs_for_vehicle(vehicle_id):
+    """Fetch the configs linked to a vehicle through the multi-valued index."""
+    return _fetch_records(
+        "configs",
+        "SELECT id, createdTime, fields FROM `configs` "
+        "WHERE %s MEMBER OF (fields->'$.vehicle')",
+        (vehicle_id,)
+    )
+
+
+# ============================================================
+# Catalog loading (local replica first, then MySQL)
+# ============================================================
+
+def _read(from_replica, from_mysql):
+    """Read from the local SQLite replica when it is published, else from MySQL."""
+    return replica.read_first(from_replica, from_mysql)
+
+
+def _load_table(table_name):
+    """Load one table for the catalog snapshot (single query, sorted by order)."""
+    order_by = None if table_name == "configs" else "order"
+    records = _read(
+        lambda: replica.fetch_all(table_name, order_by=order_by),
+        lambda: _fetch_all_from_table(table_name, order_by=order_by)
+    )
+    if table_name in SPECS_TABLES:
+        records = attach_specs_all(records)
+    return records
+
+
+_catalog = CatalogHolder(_load_table, CATALOG_TABLES, ttl=CATALOG_TTL)
+
+
+def get_catalog():
+    """Return the current catalog snapshot, loading it if needed."""
+    return _catalog.get()
+
+
+def reload_catalog():
+    """Rebuild the catalog snapshot from MySQL and swap it in."""
+    return _catalog.reload()
+
+
+def invalidate_catalog():
+    """Drop the catalog snapshot; the next read rebuilds it."""
+    _catalog.invalidate()
 
 
 # ============================================================
@@ -141,50 +160,120 @@ def _fetch_by_field(table_name, field_name, field_value):
 
 def get_vehicles():
     """Get all vehicles sorted by order."""
-    return get_cached("vehicles", lambda: _fetch_all_from_table("vehicles", order_by="order"))
+    return get_catalog().all("vehicles")
 
 
 def get_heads():
     """Get all heads sorted by order."""
-    return get_cached("heads", lambda: _fetch_all_from_table("heads", order_by="order"))
+    return get_catalog().all("heads")
 
 
 def get_grips():
     """Get all grips sorted by order."""
-    return get_cached("grips", lambda: _fetch_all_from_table("grips", order_by="order"))
+    return get_catalog().all("grips")
+
+
+def _get_by_slug(table_name, key_prefix, slug):
+    """
+    Look a record up in the catalog snapshot when it is loaded,
+    otherwise read the single row through the slug index.
+    """
+    catalog = _catalog.peek()
+    if catalog is not None:
+        return catalog.get_by_slug(table_name, slug)
+    def fetcher():
+        record = _read(
+            lambda: replica.fetch_by_slug(table_name, slug),
+            lambda: _fetch_by_field(table_name, "slug", slug)
+        )
+        if table_name in SPECS_TABLES:
+            record = attach_specs(record)
+        return record
+
+    return get_cached(f"{key_prefix}_{slug}", fetcher)
 
 
 def get_vehicle_by_slug(slug):
     """Get a vehicle by its slug."""
-    return get_cached(
-        f"vehicle_{slug}",
-        lambda: _fetch_by_field("vehicles", "slug", slug)
-    )
+    return _get_by_slug("vehicles", "vehicle", slug)
 
 
 def get_head_by_slug(slug):
     """Get a head by its slug."""
-    return get_cached(
-        f"head_{slug}",
-        lambda: _fetch_by_field("heads", "slug", slug)
-    )
+    return _get_by_slug("heads", "head", slug)
 
 
 def get_grip_by_slug(slug):
     """Get a grip by its slug."""
-    return get_cached(
-        f"grip_{slug}",
-        lambda: _fetch_by_field("grips", "slug", slug)
-    )
+    return _get_by_slug("grips", "grip", slug)
 
 
 def get_configs_for_vehicle(vehicle_id):
     """Get all configs for a specific vehicle."""
-    def fetcher():
-        all_configs = _fetch_all_from_table("configs")
-        return [
-            c for c in all_configs
-            if vehicle_id in c["fields"].get("vehicle", [])
-        ]
-    
-    return get_cached(f"configs_vehicle_{vehicle_id}", fetcher)
+    catalog = _catalog.peek()
+    if catalog is not None:
+        return catalog.configs_for_vehicle(vehicle_id)
+    return get_cached(
+        f"configs_vehicle_{vehicle_id}",
+        lambda: _read(
+            lambda: replica.fetch_configs_for_vehicle(vehicle_id),
+            lambda: _fetch_configs_for_vehicle(vehicle_id)
+        )
+    )
+
+
+# ============================================================
+# Targeted invalidation
+# ============================================================
+
+# Per-record cache keys used before the catalog snapshot is loaded
+SLUG_KEY_PREFIXES = {"vehicles": "vehicle", "heads": "head", "grips": "grip"}
+
+
+# Returned when the whole cache generation was invalidated
+ALL_KEYS = ["*"]
+
+
+def _rewarm(changes):
+    """Rebuild what the changes dropped (runs after the admin request)."""
+    try:
+        # The snapshot serves every getter: rebuild it in one pass
+        if _catalog.peek() is not None:
+            reload_catalog()
+            return
+        for table_name, records in changes.items():
+            if table_name in SLUG_KEY_PREFIXES:
+                for r in records:
+                    if r.get("slug") and not r.get("deleted"):
+                        _get_by_slug(table_name, SLUG_KEY_PREFIXES[table_name], r["slug"])
+    except Exception as e:
+        logger.error(f"Cache re-warm failed: {e}")
+
+
+def invalidate_records(changes):
+    """
+    Drop the cache keys touched by changed records, then re-warm them in
+    the background.
+    changes: {table_name: [{"id": ..., "slug": ..., "previous_slug": ..., "vehicle": [...]}, ...]}
+    A table outside CATALOG_TABLES bumps the whole cache generation.
+    Returns the list of invalidated keys (ALL_KEYS for a generation bump).
+    """
+    if any(table_name not in CATALOG_TABLES for table_name in changes):
+        caching.bump_generation()
+        invalidate_catalog()
+        return ALL_KEYS
+
+    keys = []
+    for table_name, records in changes.items():
+        prefix = SLUG_KEY_PREFIXES.get(table_name)
+        if prefix:
+            # Old slug of a renamed record too
+            slugs = {s for r in records for s in (r.get("slug"), r.get("previous_slug")) if s}
+            keys += [f"{prefix}_{slug}" for slug in sorted(slugs)]
+        if table_name == "configs":
+            vehicle_ids = {vid for r in records for vid in r.get("vehicle", [])}
+            keys += [f"configs_vehicle_{vid}" for vid in vehicle_ids]
+
+    caching.forget(cache, keys)
+    threading.Thread(target=_rewarm, args=(changes,), name="cache-rewarm", daemon=True).start()
+    return keys
@@ -0,0 +1,140 @@
+"""
+Shared MySQL connection pool.
+Keeps one long-lived SSH tunnel (when USE_SSH_TUNNEL is set) and a
+MySQLConnectionPool on top of it, used by app.py and utils/database.py.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from mysql.connector import errors, pooling
+from sshtunnel import SSHTunnelForwarder
+
+# Load environment variables
+load_dotenv()
+
+# MySQL Configuration
+MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
+MYSQL_USER = os.getenv("MYSQL_USER")
+MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
+MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
+
+# Pool Configuration
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "5"))
+MYSQL_POOL_TIMEOUT = float(os.getenv("MYSQL_POOL_TIMEOUT", "10"))
+
+# SSH Configuration (for local development)
+SSH_HOST = os.getenv("SSH_HOST", "ssh.pythonanywhere.com")
+SSH_USER = os.getenv("SSH_USER")
+SSH_PASSWORD = os.getenv("SSH_PASSWORD")
+USE_SSH_TUNNEL = os.getenv("USE_SSH_TUNNEL", "false").lower() == "true"
+
+_lock = threading.Lock()
+_tunnel = None
+_pool = None
+
+
+def _ensure_tunnel():
+    """Start the SSH tunnel, or restart it if it dropped. Caller holds _lock."""
+    global _tunnel, _pool
+
+    if _tunnel is not None and _tunnel.is_active:
+        return
+
+    if _tunnel is not None:
+        try:
+            _tunnel.stop()
+        except Exception:
+            pass
+
+    _tunnel = SSHTunnelForwarder(
+        (SSH_HOST, 22),
+        ssh_username=SSH_USER,
+        ssh_password=SSH_PASSWORD,
+        remote_bind_address=(MYSQL_HOST, 3306)
+    )
+    _tunnel.start()
+    # The local port changed: connections of the old pool are unusable
+    _pool = None
+
+
+def get_pool():
+    """Return the shared pool, creating it (and the tunnel) on first use."""
+    global _pool
+
+    with _lock:
+        if USE_SSH_TUNNEL:
+            _ensure_tunnel()
+
+        if _pool is None:
+            if USE_SSH_TUNNEL:
+                host, port = "127.0.0.1", _tunnel.local_bind_port
+            else:
+                host, port = MYSQL_HOST, 3306
+
+            _pool = pooling.MySQLConnectionPool(
+                pool_name="bellevitesse",
+                pool_size=MYSQL_POOL_SIZE,
+                pool_reset_session=True,
+                host=host,
+                port=port,
+                user=MYSQL_USER,
+                password=MYSQL_PASSWORD,
+                database=MYSQL_DATABASE
+            )
+        return _pool
+
+
+def _checkout(timeout):
+    """Take a connection from the pool, waiting up to timeout seconds."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return get_pool().get_connection()
+        except errors.PoolError:
+            if time.monotonic() >= deadline:
+                raise
+            time.sleep(0.05)
+
+
+def get_connection(timeout=MYSQL_POOL_TIMEOUT):
+    """
+    Check a healthy connection out of the pool.
+    Calling close() on it returns it to the pool.
+    """
+    connection = _checkout(timeout)
+    try:
+        connection.ping(reconnect=True, attempts=1, delay=0)
+        return connection
+    except errors.Error:
+        try:
+            # Returning it to the pool resets the session, which fails too on a dead server
+            connection.close()
+        except errors.Error:
+            pass
+
+    # The server or the tunnel went away: reset and retry once
+    reset()
+    connection = _checkout(timeout)
+    connection.ping(reconnect=True, attempts=1, delay=0)
+    return connection
+
+
+@contextmanager
+def connection(timeout=MYSQL_POOL_TIMEOUT):
+    """Context manager returning a pooled connection to the pool on exit."""
+    conn = get_connection(timeout)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def reset():
+    """Drop the pool so the next checkout reconnects (and restarts the tunnel)."""
+    global _pool
+    with _lock:
+        _pool = None
@@ -0,0 +1,190 @@
+"""
+Facet indexes of the vehicle catalog, for server-side filtering.
+Built once per loaded vehicle list: each online vehicle gets a position,
+and a set of vehicles is a bitmap (a Python int, bit i = i-th vehicle).
+- numeric facets: values sorted with their positions, plus cumulative
+  bitmaps, so a range is two bisects and one AND
+- categorical facets: one bitmap per value
+A query ANDs the bitmaps of its filters; facet counts come from the same
+bitmaps.
+"""
+
+import math
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+
+# Facets of SPECS_CONFIG fields (see specs_config.py)
+NUMERIC_FACETS = ["max_speed", "max_operating_speed", "passengers", "weight", "battery_life"]
+CATEGORY_FACETS = ["type", "brand"]
+
+# ranges: {facet: (low, high)} (None = open), categories: {facet: {values}}
+Filters = namedtuple("Filters", ["ranges", "categories"])
+FacetResult = namedtuple("FacetResult", ["records", "count", "facets"])
+
+NUMBER = re.compile(r"-?\d+(?:[.,]\d+)?")
+
+
+def to_number(value):
+    """Numeric value of a field ("8 h" -> 8.0), None if it has none."""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    match = NUMBER.search(str(value))
+    return float(match.group(0).replace(",", ".")) if match else None
+
+
+def category_values(value):
+    """Values of a single or multiple select field."""
+    if value is None or value == "":
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    return [str(value)]
+
+
+def popcount(bitmap):
+    return bin(bitmap).count("1")
+
+
+def parse_filters(args):
+    """
+    Query string -> Filters: <facet>_min / <facet>_max for numeric facets,
+    <facet>=value (repeatable) for categorical ones.
+    Raises ValueError on an invalid number.
+    """
+    ranges = {}
+    for name in NUMERIC_FACETS:
+        bounds = []
+        for suffix in ("min", "max"):
+            raw = args.get(f"{name}_{suffix}", "").strip()
+            if not raw:
+                bounds.append(None)
+                continue
+            try:
+                number = float(raw)
+            except ValueError:
+                number = math.nan
+            if not math.isfinite(number):
+                raise ValueError(f"Invalid number for {name}_{suffix}: {raw!r}")
+            bounds.append(number)
+        if bounds != [None, None]:
+            ranges[name] = tuple(bounds)
+
+    categories = {}
+    for name in CATEGORY_FACETS:
+        values = {v for v in args.getlist(name) if v}
+        if values:
+            categories[name] = values
+
+    return Filters(ranges, categories)
+
+
+class FacetIndex:
+    """Bitmap indexes over the online records of a catalog list."""
+
+    def __init__(self, records):
+        self.records = [r for r in records if r["fields"].get("status") == "Online"]
+        self.all = (1 << len(self.records)) - 1
+
+        # facet -> (sorted values, their positions, cumulative bitmaps)
+        self.numeric = {}
+        for name in NUMERIC_FACETS:
+            entries = sorted(
+                (number, position)
+                for position, record in enumerate(self.records)
+                if (number := to_number(record["fields"].get(name))) is not None
+            )
+            prefix = [0]
+            for _, position in entries:
+                prefix.append(prefix[-1] | 1 << position)
+            self.numeric[name] = (
+                [number for number, _ in entries],
+                [position for _, position in entries],
+                prefix,
+            )
+
+        # facet -> {value: bitmap}
+        self.categories = {}
+        for name in CATEGORY_FACETS:
+            bitmaps = defaultdict(int)
+            for position, record in enumerate(self.records):
+                for value in category_values(record["fields"].get(name)):
+                    bitmaps[value] |= 1 << position
+            self.categories[name] = dict(bitmaps)
+
+    def range_bitmap(self, name, low=None, high=None):
+        values, _, prefix = self.numeric[name]
+        start = 0 if low is None else bisect_left(values, low)
+        stop = len(values) if high is None else bisect_right(values, high)
+        if start >= stop:
+            return 0
+        return prefix[stop] & ~prefix[start]
+
+    def category_bitmap(self, name, values):
+        bitmaps = self.categories[name]
+        bitmap = 0
+        for value in values:
+            bitmap |= bitmaps.get(value, 0)
+        return bitmap
+
+    def select(self, bitmap):
+        """Records of a bitmap, in catalog order."""
+        return [record for position, record in enumerate(self.records) if bitmap >> position & 1]
+
+    def _intersect(self, bitmaps, exclude=None):
+        result = self.all
+        for name, bitmap in bitmaps.items():
+            if name != exclude:
+                result &= bitmap
+        return result
+
+    def facet_counts(self, bitmaps):
+        """
+        Counts of each facet among the records matching the *other*
+        filters, so a selected value does not hide its alternatives.
+        """
+        facets = {}
+        for name, (values, positions, _) in self.numeric.items():
+            base = self._intersect(bitmaps, exclude=name)
+            matching = [v for v, p in zip(values, positions) if base >> p & 1]
+            facets[name] = {
+                "count": len(matching),
+                "min": matching[0] if matching else None,
+                "max": matching[-1] if matching else None,
+            }
+        for name, value_bitmaps in self.categories.items():
+            base = self._intersect(bitmaps, exclude=name)
+            facets[name] = {
+                value: popcount(base & bitmap)
+                for value, bitmap in sorted(value_bitmaps.items())
+            }
+        return facets
+
+    def query(self, filters):
+        bitmaps = {}
+        for name, (low, high) in filters.ranges.items():
+            bitmaps[name] = self.range_bitmap(name, low, high)
+        for name, values in filters.categories.items():
+            bitmaps[name] = self.category_bitmap(name, values)
+
+        matches = self._intersect(bitmaps)
+        return FacetResult(
+            records=self.select(matches),
+            count=popcount(matches),
+            facets=self.facet_counts(bitmaps),
+        )
+
+
+_index = None  # (records, FacetIndex)
+
+
+def get_facet_index(records):
+    """Index of `records`, rebuilt only when a new list has been loaded."""
+    global _index
+    memo = _index
+    if memo is None or memo[0] is not records:
+        memo = (records, FacetIndex(records))
+        _index = memo
+    return memo[1]
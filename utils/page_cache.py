@@ -0,0 +1,80 @@
+"""
+Rendered-page cache.
+Keeps the HTML of catalog pages in a per-process dict keyed by catalog
+version and path, and answers conditional requests with 304 through a
+strong ETag.
+"""
+
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+from utils import caching
+
+VERSION_KEY = "catalog_version"
+
+
+class PageCache:
+    def __init__(self, cache, timeout=3600, max_age=300):
+        self.cache = cache
+        self.timeout = timeout
+        self.max_age = max_age
+        self._pages = {}
+
+    def version(self):
+        """
+        Current catalog version, shared by all workers through the cache.
+        A new generation, or deleting the version key, mints a new version,
+        which retires every page.
+        """
+        key = caching.versioned_key(VERSION_KEY)
+        version = self.cache.get(key)
+        if version is None:
+            self.cache.add(key, uuid.uuid4().hex, timeout=self.timeout * 2)
+            version = self.cache.get(key)
+        return version
+
+    def invalidate(self):
+        """Mint a new catalog version on the next request."""
+        self.cache.delete(caching.versioned_key(VERSION_KEY))
+
+    def _store(self, version, path, body):
+        # Drop pages rendered for older catalog versions
+        for key in list(self._pages):
+            if key[0] != version:
+                self._pages.pop(key, None)
+
+        etag = hashlib.sha1(body).hexdigest()
+        entry = (etag, body, time.time() + self.timeout)
+        self._pages[(version, path)] = entry
+        return entry
+
+    def clear(self):
+        self._pages.clear()
+
+    def cached(self, view):
+        """Decorator: serve the view from the page cache, with ETag / 304."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if current_app.debug:
+                return view(*args, **kwargs)
+
+            version = self.version()
+            entry = self._pages.get((version, request.path))
+            if entry is None or entry[2] < time.time():
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                entry = self._store(version, request.path, response.get_data())
+
+            etag, body, _ = entry
+            response = current_app.response_class(body, mimetype="text/html")
+            response.set_etag(etag)
+            response.cache_control.public = True
+            response.cache_control.max_age = self.max_age
+            return response.make_conditional(request)
+
+        return wrapper
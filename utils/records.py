@@ -0,0 +1,277 @@
+"""
+Typed catalog records.
+Airtable payloads and the MySQL JSON column are decoded straight into
+frozen msgspec Structs: one compact object per record and per attachment
+instead of nested dicts, and decoding skips the intermediate dicts.
+
+The structs keep the dict-style API used by the templates and helpers
+(record["fields"], fields.get("slug"), fields.items()). Fields missing
+in Airtable are None, or an empty tuple for lists.
+
+Airtable cells are free-form: scalar fields are typed Any, and a record
+that still fails validation is logged and kept as a RawRecord (plain
+dict fields), so one bad cell never breaks a whole list. Fields unknown
+to the structs are logged once, as they are not exposed to templates.
+"""
+
+from typing import Any, ClassVar, Dict, Optional, Tuple
+
+import logging
+
+import msgspec
+
+logger = logging.getLogger(__name__)
+
+# Numbers typed in Airtable can hold any text ("120 kg", "2-3")
+Number = Any
+
+
+class Frozen(msgspec.Struct, frozen=True):
+    """Struct readable like the Airtable dicts it replaces."""
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None)
+        return default if value is None else value
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __contains__(self, name):
+        return getattr(self, name, None) is not None
+
+    def items(self):
+        return [
+            (name, getattr(self, name))
+            for name in self.__struct_fields__
+            if getattr(self, name) not in (None, ())
+        ]
+
+
+# ============================================================
+# Attachments
+# ============================================================
+
+class Thumbnail(Frozen):
+    url: str
+    width: Optional[int] = None
+    height: Optional[int] = None
+
+
+class Thumbnails(Frozen):
+    small: Optional[Thumbnail] = None
+    large: Optional[Thumbnail] = None
+    full: Optional[Thumbnail] = None
+
+
+class VariantSource(Frozen):
+    url: str
+    width: int
+    height: int
+
+
+class Variants(Frozen):
+    """Responsive variants built by the sync (see sync_airtable.build_variants)."""
+    width: int
+    height: int
+    sources: Dict[str, Tuple[VariantSource, ...]] = {}
+
+
+class Attachment(Frozen):
+    id: Optional[str] = None
+    url: Optional[str] = None
+    filename: Optional[str] = None
+    size: Optional[int] = None
+    type: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    thumbnails: Optional[Thumbnails] = None
+    variants: Optional[Variants] = None
+
+
+Attachments = Tuple[Attachment, ...]
+
+
+# ============================================================
+# Fields
+# ============================================================
+
+class CatalogFields(Frozen):
+    """Fields shared by the catalog tables."""
+    name: Optional[str] = None
+    slug: Optional[str] = None
+    status: Optional[str] = None
+    order: Number = None
+    description: Any = None
+    thumbnail: Attachments = ()
+
+
+class ProductFields(CatalogFields):
+    """Vehicles and heads: the fields read by SPECS_CONFIG and the pages."""
+    powerquote: Any = None
+    banner: Attachments = ()
+    gallery: Attachments = ()
+    brand: Any = None
+    model: Any = None
+    type: Any = None
+    max_speed: Number = None
+    max_operating_speed: Number = None
+    passengers: Number = None
+    power: Any = None
+    torque: Any = None
+    battery_type: Any = None
+    battery_life: Any = None
+    charging_time: Any = None
+    remote_compatibility: Any = None
+    mount: Any = None
+    power_supply: Any = None
+    operating_temperatures: Any = None
+    weather_rating: Any = None
+    camera_tray_depth: Any = None
+    camera_tray_width: Any = None
+    camera_tray_height: Any = None
+    length: Any = None
+    width: Any = None
+    height: Any = None
+    weight: Number = None
+
+
+class VehicleFields(ProductFields):
+    setups: Tuple[str, ...] = ()
+    blueprint_side: Attachments = ()
+    blueprint_top: Attachments = ()
+
+
+class HeadFields(ProductFields):
+    payload: Number = None
+    pan_range: Any = None
+    tilt_range: Any = None
+    roll_range: Any = None
+
+
+class ConfigFields(Frozen):
+    name: Optional[str] = None
+    type: Optional[str] = None
+    order: Number = None
+    vehicle: Tuple[str, ...] = ()
+    image: Attachments = ()
+
+
+class GripCategoryFields(CatalogFields):
+    pass
+
+
+# ============================================================
+# Records
+# ============================================================
+
+class Specs(Frozen):
+    left: Dict[str, Any] = {}
+    right: Dict[str, Any] = {}
+
+
+class Record(Frozen):
+    id: str
+    createdTime: Optional[str] = None
+
+
+class Vehicle(Record):
+    fields_type: ClassVar = VehicleFields
+    fields: VehicleFields = msgspec.field(default_factory=VehicleFields)
+    specs: Optional[Specs] = None
+
+
+class Head(Record):
+    fields_type: ClassVar = HeadFields
+    fields: HeadFields = msgspec.field(default_factory=HeadFields)
+    specs: Optional[Specs] = None
+
+
+class Config(Record):
+    fields_type: ClassVar = ConfigFields
+    fields: ConfigFields = msgspec.field(default_factory=ConfigFields)
+
+
+class GripCategory(Record):
+    fields_type: ClassVar = GripCategoryFields
+    fields: GripCategoryFields = msgspec.field(default_factory=GripCategoryFields)
+
+
+class GripProduct(Record):
+    """Grip products keep a dict: grip.html lists every field they have."""
+    fields_type: ClassVar = dict
+    fields: Dict[str, Any] = {}
+
+
+class RawRecord(Record):
+    """Fallback for a record its struct rejects: fields stay a dict."""
+    fields_type: ClassVar = dict
+    fields: Dict[str, Any] = {}
+    specs: Optional[Specs] = None
+
+
+# Record type of each table (Airtable and MySQL names)
+RECORD_TYPES = {
+    "vehicles": Vehicle,
+    "heads": Head,
+    "configs": Config,
+    "grips_categories": GripCategory,
+    "grip_products": GripProduct,
+    "grips": GripProduct,
+}
+
+
+# (record type, field) pairs already reported as unknown
+_reported_fields = set()
+
+
+def _report_unknown_fields(record_type, fields):
+    fields_type = record_type.fields_type
+    if fields_type is dict or not isinstance(fields, dict):
+        return
+    for name in fields.keys() - set(fields_type.__struct_fields__):
+        if (record_type, name) not in _reported_fields:
+            _reported_fields.add((record_type, name))
+            logger.warning(f"{record_type.__name__}: field {name!r} is not declared, it is ignored")
+
+
+def _fallback(record_type, record, error):
+    logger.error(f"{record_type.__name__} {record.get('id')} kept as raw fields: {error}")
+    return msgspec.convert(record, type=RawRecord, strict=False)
+
+
+def convert_record(record_type, record):
+    """Airtable record dict -> struct (None stays None)."""
+    if record is None:
+        return None
+    _report_unknown_fields(record_type, record.get("fields"))
+    try:
+        return msgspec.convert(record, type=record_type, strict=False)
+    except msgspec.ValidationError as e:
+        return _fallback(record_type, record, e)
+
+
+def convert_records(record_type, records):
+    """List of Airtable record dicts -> list of structs, in one C call when all are valid."""
+    for record in records:
+        _report_unknown_fields(record_type, record.get("fields"))
+    try:
+        return msgspec.convert(records, type=list[record_type], strict=False)
+    except msgspec.ValidationError:
+        # One bad record must not take the list down: convert them one by one
+        return [convert_record(record_type, record) for record in records]
+
+
+def decode_record(record_type, record_id, created_time, raw_fields):
+    """MySQL row (JSON text of `fields`) -> struct, without building dicts."""
+    try:
+        if isinstance(raw_fields, (str, bytes)):
+            fields = msgspec.json.decode(raw_fields, type=record_type.fields_type, strict=False)
+        else:
+            fields = msgspec.convert(raw_fields or {}, type=record_type.fields_type, strict=False)
+    except msgspec.ValidationError as e:
+        fields = msgspec.json.decode(raw_fields) if isinstance(raw_fields, (str, bytes)) else raw_fields
+        return _fallback(record_type, {"id": record_id, "createdTime": created_time, "fields": fields}, e)
+    return record_type(id=record_id, createdTime=created_time, fields=fields)
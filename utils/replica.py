@@ -0,0 +1,157 @@
+"""
+Local SQLite read replica of the catalog.
+sync_airtable.py writes the synced tables to a new SQLite file and renames
+it over REPLICA_PATH, so the file is never modified in place. Readers open
+it read-only and immutable (no locking) with memory-mapped I/O, and reopen
+it when a new file has been published.
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+
+from markupsafe import Markup, escape
+
+from utils.records import RECORD_TYPES, decode_record
+
+REPLICA_PATH = os.getenv("CATALOG_REPLICA_PATH", os.path.join(".sync", "catalog.sqlite3"))
+REPLICA_MMAP_SIZE = int(os.getenv("CATALOG_REPLICA_MMAP_SIZE", str(64 * 1024 * 1024)))
+
+# Read the replica before the source of truth (MySQL or the Airtable API)
+USE_REPLICA = os.getenv("CATALOG_REPLICA", "true").lower() == "true"
+
+# Config -> vehicle links, one row per link (indexed by vehicle)
+CONFIG_LINKS_TABLE = "config_vehicles"
+
+# Full-text search: table (and its FTS5 index) built at sync time;
+# bm25 weights follow SEARCH_COLUMNS
+SEARCH_TABLE = "search"
+SEARCH_COLUMNS = ["name", "brand", "model", "type", "description"]
+SEARCH_WEIGHTS = [10.0, 5.0, 5.0, 2.0, 1.0]
+
+# Snippet markers, replaced by <mark> once the text is escaped
+SNIPPET_START, SNIPPET_END = "\x02", "\x03"
+
+_local = threading.local()
+
+logger = logging.getLogger(__name__)
+
+
+def available(path=REPLICA_PATH):
+    return os.path.exists(path)
+
+
+def read_first(from_replica, fallback):
+    """
+    Read from the replica when it is published, else from `fallback`.
+    The replica keeps pages working while the source is down or slow.
+    """
+    if USE_REPLICA and available():
+        try:
+            return from_replica()
+        except sqlite3.Error as e:
+            logger.error(f"Replica read failed, falling back to the source: {e}")
+    return fallback()
+
+
+def _file_identity(path):
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+def _connect(path):
+    uri = f"file:{os.path.abspath(path)}?mode=ro&immutable=1"
+    connection = sqlite3.connect(uri, uri=True)
+    connection.execute(f"PRAGMA mmap_size = {REPLICA_MMAP_SIZE}")
+    return connection
+
+
+def get_connection(path=REPLICA_PATH):
+    """Per-thread read-only connection, reopened when a new replica is published."""
+    identity = _file_identity(path)
+    connection = getattr(_local, "connection", None)
+    if connection is None or _local.identity != identity:
+        if connection is not None:
+            connection.close()
+        connection = _connect(path)
+        _local.connection = connection
+        _local.identity = identity
+    return connection
+
+
+def _fetch_records(table_name, query, params=()):
+    record_type = RECORD_TYPES[table_name]
+    rows = get_connection().execute(query, params).fetchall()
+    return [decode_record(record_type, *row) for row in rows]
+
+
+def fetch_all(table_name, order_by=None):
+    """All records of a table, sorted by `order` when asked."""
+    query = f"SELECT id, createdTime, fields FROM [{table_name}]"
+    if order_by == "order":
+        query += " ORDER BY sort_order"
+    return _fetch_records(table_name, query)
+
+
+def fetch_by_slug(table_name, slug):
+    records = _fetch_records(
+        table_name,
+        f"SELECT id, createdTime, fields FROM [{table_name}] WHERE slug = ? LIMIT 1",
+        (slug,)
+    )
+    return records[0] if records else None
+
+
+def fetch_configs_for_vehicle(vehicle_id):
+    return _fetch_records(
+        "configs",
+        f"SELECT c.id, c.createdTime, c.fields FROM configs c "
+        f"JOIN [{CONFIG_LINKS_TABLE}] l ON l.config_id = c.id "
+        f"WHERE l.vehicle_id = ?",
+        (vehicle_id,)
+    )
+
+
+def match_expression(query):
+    """User input -> FTS5 query: every word must match, as a prefix."""
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _highlight(snippet):
+    return Markup(
+        escape(snippet)
+        .replace(SNIPPET_START, Markup("<mark>"))
+        .replace(SNIPPET_END, Markup("</mark>"))
+    )
+
+
+def search(query, limit=20):
+    """
+    Ranked (bm25) search in the catalog index.
+    Returns [{"kind", "url", "name", "snippet"}]; snippets are safe HTML.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return []
+
+    weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+    rows = get_connection().execute(
+        f"""
+        SELECT s.kind, s.url, s.name,
+               snippet([{SEARCH_TABLE}_fts], -1, ?, ?, '…', 12)
+        FROM [{SEARCH_TABLE}_fts]
+        JOIN [{SEARCH_TABLE}] s ON s.rowid = [{SEARCH_TABLE}_fts].rowid
+        WHERE [{SEARCH_TABLE}_fts] MATCH ?
+        ORDER BY bm25([{SEARCH_TABLE}_fts], {weights})
+        LIMIT ?
+        """,
+        (SNIPPET_START, SNIPPET_END, expression, limit)
+    ).fetchall()
+
+    return [
+        {"kind": kind, "url": url, "name": name, "snippet": _highlight(snippet)}
+        for kind, url, name, snippet in rows
+    ]
@@ -1,4 +1,7 @@
+import msgspec
+
 from specs_config import SPECS_CONFIG
+from utils.records import Specs
 
 def keep(v):
     return v is not None and v != ""
@@ -20,3 +23,27 @@ def build_specs(fields):
                 specs_right[label] = value
 
     return specs_left, specs_right
+
+
+def attach_specs(record):
+    """
+    Calcule les specs une seule fois et les joint au record
+    (au chargement du catalogue), pour que les pages les réutilisent.
+    Les records sont immuables : retourne une copie avec les specs.
+    """
+    if record:
+        specs_left, specs_right = build_specs(record["fields"])
+        record = msgspec.structs.replace(record, specs=Specs(left=specs_left, right=specs_right))
+    return record
+
+
+def attach_specs_all(records):
+    return [attach_specs(record) for record in records]
+
+
+def get_specs(record):
+    """Retourne (specs_left, specs_right), précalculées si possible."""
+    specs = record.get("specs")
+    if specs is None:
+        return build_specs(record["fields"])
+    return specs["left"], specs["right"]